@@ -0,0 +1,263 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Count elections from Python, returning structured results without printing anything
+#
+#    election = api.load('election.blt')
+#    result = api.count(election, api.CountOptions(method='wright'))
+#    print(result.winners)
+#
+# The kind of arithmetic is process-wide (see utils.num), so counts should not be run concurrently in threads of one process.
+
+from .utils import common
+from .utils import events
+from . import irv
+from . import meek_stv
+from . import stv
+from . import utils
+from . import wright_stv
+
+import dataclasses
+from typing import Any, Dict, List, Optional, Tuple
+
+METHODS = {
+	'stv': stv.STVCounter,
+	'wright': wright_stv.WrightSTVCounter,
+	'meek': meek_stv.MeekSTVCounter,
+	'irv': irv.IRVCounter,
+}
+
+# Quota, and whether the quota is progressive, for each method unless otherwise specified
+METHOD_QUOTAS = {
+	'stv': ('geq-droop', False),
+	'wright': ('geq-droop', True),
+	'meek': ('geq-hb', True),
+	'irv': ('gt-hb', True),
+}
+
+@dataclasses.dataclass
+class CountOptions:
+	method: str = 'stv'
+	# Number of seats, if not that of the election
+	seats: Optional[int] = None
+	nums: str = 'fraction'
+	decimals: int = 6
+	rounding: str = 'truncate'
+	quota: Optional[str] = None
+	quotaProg: Optional[bool] = None
+	# Tie-breaking methods, in preference order; 'manual' is not available
+	ties: List[str] = dataclasses.field(default_factory=lambda: ['backward'])
+	randfile: Optional[str] = None
+	randbyte: int = 0
+	fast: bool = False
+	parcels: bool = False
+	trie: bool = False
+	incremental: bool = False
+	numpy: bool = False
+	processes: int = 1
+	# With processes and float or Decimal arithmetic, add per-shard subtotals, which may not match a serial count exactly
+	shardSubtotals: bool = False
+
+@dataclasses.dataclass
+class Election:
+	ballots: common.BallotSet
+	# Candidates contesting the election, excluding any withdrawn
+	candidates: List[common.Candidate]
+	seats: int
+	name: str = ''
+	
+	@classmethod
+	def fromBallots(cls, ballots, candidates, seats, name=''):
+		return cls(common.BallotSet.fromBallots(ballots, candidates), list(candidates), seats, name)
+
+@dataclasses.dataclass
+class CountRound:
+	number: int
+	# Votes of each candidate remaining in the count, by name
+	tally: Dict[str, Any] = dataclasses.field(default_factory=dict)
+	exhausted: Any = None
+	quota: Any = None
+	elected: List[str] = dataclasses.field(default_factory=list)
+	excluded: List[str] = dataclasses.field(default_factory=list)
+	# (candidate, transfer value) of each surplus distributed
+	transfers: List[Tuple[str, Any]] = dataclasses.field(default_factory=list)
+
+@dataclasses.dataclass
+class CountResult:
+	# In order of election
+	winners: List[str]
+	exhausted: Any
+	rounds: List[CountRound]
+	# Every quota calculated, in order
+	quotas: List[Any]
+	# (candidate, transfer value) of every surplus distributed, in order
+	transferValues: List[Tuple[str, Any]]
+	# Final keep value of each winner, for Meek STV
+	keepValues: Optional[Dict[str, Any]] = None
+	# Notes on the count, such as the resolution of ties
+	messages: List[str] = dataclasses.field(default_factory=list)
+	
+	# Return the result as a JSON-serialisable dict, with numbers as exact strings
+	def toJSON(self):
+		def convert(value):
+			if isinstance(value, (str, int, bool)) or value is None:
+				return value
+			if isinstance(value, (list, tuple)):
+				return [convert(x) for x in value]
+			if isinstance(value, dict):
+				return {k: convert(v) for k, v in value.items()}
+			return str(value)
+		return convert(dataclasses.asdict(self))
+
+# Builds the rounds of a CountResult from the events of a count
+class ResultRecorder:
+	detailed = False
+	
+	def __init__(self):
+		self.rounds = []
+		self.quotas = []
+		self.transferValues = []
+		self.messages = []
+	
+	def currentRound(self):
+		if not self.rounds:
+			self.rounds.append(CountRound(1))
+		return self.rounds[-1]
+	
+	def write(self, event):
+		if isinstance(event, events.Round):
+			self.rounds.append(CountRound(event.count))
+		elif isinstance(event, events.Quota):
+			self.quotas.append(event.quota)
+			self.currentRound().quota = event.quota
+		elif isinstance(event, events.Tally):
+			self.currentRound().tally = {candidate.name: votes for candidate, votes in event.tally.items()}
+			self.currentRound().exhausted = event.exhausted
+		elif isinstance(event, events.Election):
+			self.currentRound().elected.append(event.candidate.name)
+		elif isinstance(event, events.Exclusion):
+			self.currentRound().excluded.append(event.candidate.name)
+		elif isinstance(event, events.SurplusTransfer):
+			self.transferValues.append((event.candidate.name, event.value))
+			self.currentRound().transfers.append((event.candidate.name, event.value))
+		elif isinstance(event, events.Message):
+			self.messages.append(event.text)
+	
+	def close(self):
+		pass
+
+# Read an election from a blt or compiled blt file
+# By default, identical ballots are merged only if the current kind of arithmetic is exact (see utils.exact); pass aggregate=False to load an election to be counted with inexact arithmetic
+def load(path, aggregate=None):
+	from .utils import blt, bltc
+	
+	if aggregate is None:
+		aggregate = utils.exact()
+	
+	if bltc.isBLTC(path):
+		ballots, candidates, seats = bltc.readBLTC(path)
+	else:
+		with open(path, 'r') as electionFile:
+			ballots, candidates, seats = blt.readBLTFile(electionFile, aggregate=aggregate)
+	return Election(ballots, candidates, seats, ballots.name)
+
+# Read an election from a file of gamma-encoded ballots, for the candidates with the given names
+def loadGamma(path, candidateNames, seats, binary=False, name='', aggregate=None):
+	from .utils import gammaballots
+	
+	if aggregate is None:
+		aggregate = utils.exact()
+	
+	candidates = [common.Candidate(x) for x in candidateNames]
+	ballots = gammaballots.readGammaFile(path, candidates, binary, aggregate)
+	ballots.name = name
+	return Election(ballots, candidates, seats, name)
+
+def _convert(value):
+	try:
+		return utils.num(value)
+	except TypeError:
+		# e.g. Decimal from Fraction
+		return utils.num(value.numerator) / utils.num(value.denominator)
+
+# Copy the election with fresh candidates and values of the current kind of arithmetic, so that it can be counted again
+def _prepare(election):
+	ballots = election.ballots
+	candidates = [common.Candidate(candidate.name) for candidate in ballots.candidates]
+	ballotSet = common.BallotSet(candidates, [_convert(value) for value in ballots.values], ballots.offsets, ballots.preferences)
+	ballotSet.numLoaded = ballots.numLoaded
+	ballotSet.name = ballots.name
+	return ballotSet, [candidates[candidate.index] for candidate in election.candidates]
+
+def _counterArgs(options, seats):
+	quota, quotaProg = METHOD_QUOTAS[options.method]
+	return {
+		'seats': seats,
+		'nums': options.nums,
+		'quota': options.quota or quota,
+		'quota_prog': quotaProg if options.quotaProg is None else options.quotaProg,
+		'ties': list(options.ties),
+		'randfile': options.randfile,
+		'randbyte': str(options.randbyte),
+		'fast': options.fast,
+		'parcels': options.parcels,
+		'trie': options.trie,
+		'incremental': options.incremental,
+		'numpy': options.numpy,
+		'processes': options.processes,
+		'shard_subtotals': options.shardSubtotals,
+		'quiet': True,
+		'verbose': False,
+		'noround': True,
+	}
+
+# Count the election, returning a CountResult
+# Any given event sinks also receive the events of the count, and are closed afterwards
+def count(election, options=None, sinks=()):
+	if options is None:
+		options = CountOptions()
+	if options.method not in METHODS:
+		raise ValueError('Unknown counting method {}'.format(options.method))
+	if 'manual' in options.ties:
+		raise ValueError('Ties cannot be broken manually when counting from Python')
+	
+	cls = METHODS[options.method]
+	cls.setNums(options)
+	
+	ballots, candidates = _prepare(election)
+	seats = election.seats if options.seats is None else options.seats
+	counter = cls(ballots, candidates, **_counterArgs(options, seats))
+	
+	recorder = ResultRecorder()
+	counter.events = events.EventLog([recorder] + list(sinks))
+	
+	try:
+		elected, comments, exhausted = counter.countVotes()
+	finally:
+		counter.close()
+	
+	keepValues = None
+	if options.method == 'meek':
+		keepValues = {candidate.name: candidate.keep_value for candidate in elected}
+	
+	return CountResult(
+		winners=[candidate.name for candidate in elected],
+		exhausted=exhausted,
+		rounds=recorder.rounds,
+		quotas=recorder.quotas,
+		transferValues=recorder.transferValues,
+		keepValues=keepValues,
+		messages=recorder.messages,
+	)
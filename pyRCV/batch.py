@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Count many elections across a pool of worker processes, writing each result as a JSON line as it completes
+#
+# Elections are given as a directory of blt files, or a manifest of JSON lines such as
+#    {"election": "ward1.blt", "method": "wright", "nums": "float"}
+# where any other keys are fields of api.CountOptions, and relative paths are relative to the manifest.
+
+from . import api
+from . import stv
+from . import version
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+# Return the jobs listed in a manifest file, as (id, path, options) tuples, and an error record for each line that is not a valid entry
+def readManifest(path, defaults):
+	jobs = []
+	failed = []
+	base = os.path.dirname(path)
+	with open(path, 'r') as f:
+		for lineNo, line in enumerate(f, 1):
+			if not line.strip():
+				continue
+			try:
+				entry = json.loads(line)
+				if not isinstance(entry, dict):
+					raise ValueError('Expected a JSON object, not {}'.format(type(entry).__name__))
+				if 'election' not in entry:
+					raise ValueError('No election given')
+			except ValueError as ex:
+				failed.append({'id': '{}:{}'.format(os.path.basename(path), lineNo), 'election': None, 'options': None, 'status': 'error', 'error': '{}: {}'.format(type(ex).__name__, ex), 'time': 0})
+				continue
+			election = os.path.join(base, entry.pop('election'))
+			jobId = entry.pop('id', os.path.basename(election))
+			jobs.append((jobId, election, dict(defaults, **entry)))
+	return jobs, failed
+
+# Return a job for each blt or compiled blt file in the directory
+def readDirectory(path, defaults):
+	jobs = []
+	for name in sorted(os.listdir(path)):
+		if name.endswith('.blt') or name.endswith('.bltc'):
+			jobs.append((name, os.path.join(path, name), dict(defaults)))
+	return jobs
+
+# Count one election, returning a JSON-serialisable record of the result or of the failure
+def countJob(job):
+	jobId, election, options = job
+	record = {'id': jobId, 'election': election, 'options': options}
+	start = time.perf_counter()
+	try:
+		options = api.CountOptions(**options)
+		stv.STVCounter.setNums(options)
+		result = api.count(api.load(election), options)
+		record['status'] = 'ok'
+		record['result'] = result.toJSON()
+	except Exception as ex:
+		record['status'] = 'error'
+		record['error'] = '{}: {}'.format(type(ex).__name__, ex)
+		record['traceback'] = traceback.format_exc()
+	record['time'] = time.perf_counter() - start
+	return record
+
+# Count the jobs across the given number of processes, passing each record to callback as it completes
+def runBatch(jobs, processes, callback):
+	if processes == 1:
+		for job in jobs:
+			callback(countJob(job))
+		return
+	
+	with multiprocessing.Pool(processes) as pool:
+		for record in pool.imap_unordered(countJob, jobs):
+			callback(record)
+
+def main():
+	import argparse
+	
+	parser = argparse.ArgumentParser(description='Count many elections in parallel, writing the results as JSON lines.')
+	parser.add_argument('elections', help='Directory of blt files, or manifest of JSON lines')
+	parser.add_argument('--output', help='JSON lines file to write results to, instead of standard output')
+	parser.add_argument('--processes', help='Number of worker processes', type=int, default=os.cpu_count())
+	parser.add_argument('--method', help='Counting method, unless given in the manifest', choices=list(api.METHODS), default='stv')
+	parser.add_argument('--nums', help='Kind of arithmetic to use, unless given in the manifest', choices=['float', 'fraction', 'decimal', 'fixed'], default='fraction')
+	parser.add_argument('--ties', help='How to break ties, in preference order, unless given in the manifest', choices=['backward', 'random', 'all'], nargs='+', default=['backward'])
+	parser.add_argument('--fast', help="Don't perform a full tally", action='store_true')
+	args = parser.parse_args()
+	
+	defaults = {'method': args.method, 'nums': args.nums, 'ties': args.ties, 'fast': args.fast}
+	if os.path.isdir(args.elections):
+		jobs, invalid = readDirectory(args.elections, defaults), []
+	else:
+		jobs, invalid = readManifest(args.elections, defaults)
+	
+	outFile = open(args.output, 'w') if args.output else sys.stdout
+	failed = []
+	
+	def writeRecord(record):
+		if record['status'] != 'ok':
+			failed.append(record)
+		print(json.dumps(record), file=outFile, flush=True)
+	
+	try:
+		# Malformed manifest entries are recorded as failures, and the rest of the batch still counted
+		for record in invalid:
+			writeRecord(record)
+		runBatch(jobs, args.processes, writeRecord)
+	finally:
+		if args.output:
+			outFile.close()
+	
+	print('=== pyRCV {}: counted {} elections, {} failed ==='.format(version.VERSION, len(jobs) + len(invalid) - len(failed), len(failed)), file=sys.stderr)
+	for record in failed:
+		print('     {}: {}'.format(record['id'], record['error']), file=sys.stderr)
+	
+	if failed:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
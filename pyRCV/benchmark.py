@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Time each counter and kind of arithmetic on a synthetic or given election, storing the results as JSON
+
+from .utils import synthetic
+from . import irv
+from . import meek_stv
+from . import stv
+from . import version
+from . import wright_stv
+
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shlex
+import sys
+import tempfile
+import time
+
+# Counter class, and the options required for the method to be counted correctly
+COUNTERS = {
+	'stv': (stv.STVCounter, []),
+	'wright': (wright_stv.WrightSTVCounter, ['--quota-prog']),
+	'meek': (meek_stv.MeekSTVCounter, ['--quota', 'geq-hb', '--quota-prog']),
+	'irv': (irv.IRVCounter, []),
+}
+
+# Ties must be broken without prompting
+COMMON_ARGS = ['--quiet', '--ties', 'backward', 'all']
+
+# Count the election once, returning the time taken to load it, the time taken to count it, and the names of the winners
+def runOnce(counterName, nums, election, extraArgs=[]):
+	cls, methodArgs = COUNTERS[counterName]
+	args = cls.getParser().parse_args(['--election', election, '--nums', nums] + methodArgs + COMMON_ARGS + extraArgs)
+	cls.setNums(args)
+	
+	start = time.perf_counter()
+	ballots, candidates, args.seats = cls.readElection(args)
+	counter = cls(ballots, candidates, **vars(args))
+	loaded = time.perf_counter()
+	try:
+		elected, comments, exhausted = counter.countVotes()
+	finally:
+		counter.close()
+	counted = time.perf_counter()
+	
+	return loaded - start, counted - loaded, [candidate.name for candidate in elected]
+
+def runCase(counterName, nums, election, repeat, extraArgs=[]):
+	result = {'counter': counterName, 'nums': nums, 'args': extraArgs, 'load': [], 'count': []}
+	try:
+		for _ in range(repeat):
+			# Silence any messages from the counter, such as of ties
+			with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+				loadTime, countTime, elected = runOnce(counterName, nums, election, extraArgs)
+			result['load'].append(loadTime)
+			result['count'].append(countTime)
+		result['elected'] = elected
+		result['best'] = min(result['count'])
+		result['mean'] = sum(result['count']) / len(result['count'])
+	except Exception as ex:
+		result['error'] = '{}: {}'.format(type(ex).__name__, ex)
+	return result
+
+# As runCase, but in a separate process, giving up after timeout seconds
+def runCaseIsolated(counterName, nums, election, repeat, extraArgs=[], timeout=None):
+	with multiprocessing.Pool(1) as pool:
+		try:
+			return pool.apply_async(runCase, (counterName, nums, election, repeat, extraArgs)).get(timeout)
+		except multiprocessing.TimeoutError:
+			return {'counter': counterName, 'nums': nums, 'args': extraArgs, 'error': 'Timed out after {} seconds'.format(timeout)}
+
+def caseKey(result):
+	return (result['counter'], result['nums'], ' '.join(result.get('args', [])))
+
+# Print the best times of the results against those of a previous run, returning the keys of cases slower by more than threshold
+def compare(results, baseline, threshold):
+	previous = {caseKey(x): x for x in baseline['results']}
+	regressions = []
+	
+	print()
+	print('{:<10} {:<10} {:>10} {:>10} {:>8}'.format('counter', 'nums', 'before', 'after', 'ratio'))
+	for result in results:
+		before = previous.get(caseKey(result))
+		if before is None or 'best' not in before or 'best' not in result:
+			continue
+		ratio = result['best'] / before['best']
+		flag = ''
+		if ratio > threshold:
+			flag = ' SLOWER'
+			regressions.append(caseKey(result))
+		if before.get('elected') != result.get('elected'):
+			flag += ' WINNERS DIFFER'
+		print('{:<10} {:<10} {:>10.3f} {:>10.3f} {:>7.2f}x{}'.format(result['counter'], result['nums'], before['best'], result['best'], ratio, flag))
+	
+	return regressions
+
+def main():
+	import argparse
+	
+	parser = argparse.ArgumentParser(description='Benchmark the pyRCV counters on a synthetic or given election.')
+	parser.add_argument('--election', help='Benchmark this blt file instead of generating a synthetic election')
+	synthetic.addSpecArguments(parser)
+	parser.add_argument('--counters', help='Counters to time', choices=list(COUNTERS), nargs='+', default=list(COUNTERS))
+	parser.add_argument('--nums', help='Kinds of arithmetic to time', choices=['float', 'fraction', 'decimal', 'fixed'], nargs='+', default=['float', 'fraction', 'decimal'])
+	parser.add_argument('--counter-args', help='Further options to pass to every counter, e.g. "--trie"', default='')
+	parser.add_argument('--repeat', help='Number of times to count each case', type=int, default=3)
+	parser.add_argument('--timeout', help='Give up on a case after this many seconds', type=float, default=600)
+	parser.add_argument('--output', help='Write the results to this JSON file')
+	parser.add_argument('--compare', help='Compare the results against those in this JSON file')
+	parser.add_argument('--threshold', help='With --compare, fail if any case is slower by more than this ratio', type=float, default=1.1)
+	args = parser.parse_args()
+	
+	extraArgs = shlex.split(args.counter_args)
+	
+	report = {
+		'pyRCV': version.VERSION,
+		'python': platform.python_version(),
+		'implementation': platform.python_implementation(),
+		'machine': platform.machine(),
+		'processor': platform.processor(),
+		'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'repeat': args.repeat,
+		'results': [],
+	}
+	
+	with tempfile.TemporaryDirectory() as tempDir:
+		if args.election:
+			election = args.election
+			report['election'] = {'file': os.path.basename(election)}
+		else:
+			spec = synthetic.specFromArgs(args)
+			election = os.path.join(tempDir, 'synthetic.blt')
+			synthetic.writeBLTFile(spec, election)
+			report['election'] = spec.toJSON()
+		
+		print('{:<10} {:<10} {:>10} {:>10} {:>10}'.format('counter', 'nums', 'load', 'best', 'mean'))
+		for counterName in args.counters:
+			for nums in args.nums:
+				result = runCaseIsolated(counterName, nums, election, args.repeat, extraArgs, args.timeout)
+				report['results'].append(result)
+				if 'error' in result:
+					print('{:<10} {:<10} {}'.format(counterName, nums, result['error']))
+				else:
+					print('{:<10} {:<10} {:>10.3f} {:>10.3f} {:>10.3f}'.format(counterName, nums, min(result['load']), result['best'], result['mean']))
+	
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(report, f, indent=1)
+	
+	if args.compare:
+		with open(args.compare, 'r') as f:
+			baseline = json.load(f)
+		if compare(report['results'], baseline, args.threshold):
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,135 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Hare-Clark countbacks, filling vacancies from the quota of votes which elected each candidate, without writing and re-reading a blt file
+#
+#    elected, comments, exhausted = counter.countVotes()
+#    quotas = countback.QuotaStore.fromCounter(counter, elected)
+#    results = countback.fillVacancies(quotas, ['Candidate A', 'Candidate B'], processes=2)
+#
+# Each vacancy is filled by an IRV count of its quota among the candidates not elected, as if the others had withdrawn. Vacancies are filled independently of one another.
+
+from .utils import common
+from . import api
+from . import utils
+
+import array
+import dataclasses
+import multiprocessing
+
+# The ballots held by an elected candidate, at the values at which they elected them
+# Preferences are indices into the candidates of the main count, compiled as in a BallotSet
+class QuotaParcel:
+	def __init__(self, name, values, offsets, preferences):
+		self.name = name
+		self.values = values
+		self.offsets = offsets
+		self.preferences = preferences
+	
+	@classmethod
+	def fromCandidate(cls, candidate):
+		values = []
+		offsets = array.array('l', [0])
+		preferences = array.array('l')
+		for ballot in candidate.heldBallots():
+			values.append(ballot.value)
+			preferences.extend(preference.index for preference in ballot.ballot.preferences)
+			offsets.append(len(preferences))
+		return cls(candidate.name, values, offsets, preferences)
+	
+	@property
+	def votes(self):
+		return sum(self.values, utils.num('0'))
+	
+	def __len__(self):
+		return len(self.values)
+
+class QuotaStore:
+	def __init__(self, candidates, standing, elected, parcels):
+		# Names of the candidates of the main count, by index
+		self.candidates = candidates
+		# Names of the candidates standing in the main count, excluding any withdrawn
+		self.standing = standing
+		self.elected = elected
+		# Elected candidate name -> QuotaParcel
+		self.parcels = parcels
+	
+	# Capture the quota of each elected candidate after a count
+	# The counter must have been counted with trackBallots set
+	@classmethod
+	def fromCounter(cls, counter, elected):
+		if not counter.trackBallots:
+			raise ValueError('{} does not keep the ballots held by each candidate, so countbacks are not available'.format(type(counter).__name__))
+		
+		return cls(
+			[candidate.name for candidate in counter.ballots.candidates],
+			[candidate.name for candidate in counter.candidates],
+			[candidate.name for candidate in elected],
+			{candidate.name: QuotaParcel.fromCandidate(candidate) for candidate in elected},
+		)
+	
+	# Return the election to fill the vacancy of the named candidate, contested by every unelected candidate not in withdrawn
+	def election(self, name, withdrawn=()):
+		if name not in self.parcels:
+			raise ValueError('{} was not elected, so has no quota to count back'.format(name))
+		parcel = self.parcels[name]
+		
+		contesting = [x for x in self.standing if x not in self.elected and x not in withdrawn]
+		candidates = [common.Candidate(x) for x in contesting]
+		
+		# Map indices in the main count to indices in the countback, dropping candidates not contesting
+		indices = [None] * len(self.candidates)
+		for index, candidateName in enumerate(self.candidates):
+			if candidateName in contesting:
+				indices[index] = contesting.index(candidateName)
+		
+		# Merge ballots which are identical once candidates not contesting are removed, if this cannot change the result (see utils.exact)
+		aggregate = utils.exact()
+		values = []
+		offsets = array.array('l', [0])
+		preferences = array.array('l')
+		aggregated = {}
+		for i in range(len(parcel)):
+			key = tuple(indices[x] for x in parcel.preferences[parcel.offsets[i]:parcel.offsets[i + 1]] if indices[x] is not None)
+			if aggregate and key in aggregated:
+				values[aggregated[key]] += parcel.values[i]
+				continue
+			aggregated[key] = len(values)
+			values.append(parcel.values[i])
+			preferences.extend(key)
+			offsets.append(len(preferences))
+		
+		ballots = common.BallotSet(candidates, values, offsets, preferences)
+		ballots.numLoaded = len(parcel)
+		ballots.name = 'Countback for {}'.format(name)
+		return api.Election(ballots, candidates, 1, ballots.name)
+
+def _countVacancy(job):
+	name, election, options = job
+	return name, api.count(election, options)
+
+# Fill the vacancies of the named candidates, returning a dict of name -> api.CountResult
+# options should give the kind of arithmetic of the main count, and are otherwise those of an IRV count
+def fillVacancies(store, names, options=None, withdrawn=(), processes=1):
+	if options is None:
+		options = api.CountOptions(method='irv')
+	options = dataclasses.replace(options, seats=1)
+	
+	jobs = [(name, store.election(name, withdrawn), options) for name in names]
+	if processes == 1 or len(jobs) <= 1:
+		return dict(_countVacancy(job) for job in jobs)
+	
+	with multiprocessing.Pool(min(processes, len(jobs))) as pool:
+		return dict(pool.map(_countVacancy, jobs))
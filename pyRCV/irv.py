@@ -24,6 +24,10 @@ class IRVCounter(stv.STVCounter):
 		super().__init__(*args, **kwargs)
 		
 		self.args['seats'] = 1
+		
+		# Each iteration of --npr differs from the last only by the removal of the winner, so reuse the allocation of ballots
+		if self.args.get('npr', False):
+			self.args['incremental'] = True
 	
 	@classmethod
 	def getParser(cls):
@@ -33,26 +37,30 @@ class IRVCounter(stv.STVCounter):
 		parser.add_argument('--quota', help=argparse.SUPPRESS, default='gt-hb')
 		parser.add_argument('--quota-prog', help=argparse.SUPPRESS, action='store_true', default=True)
 		parser.add_argument('--countback', help=argparse.SUPPRESS)
+		parser.add_argument('--vacancies', help=argparse.SUPPRESS)
+		parser.add_argument('--countback-withdrawn', help=argparse.SUPPRESS, default=[])
+		parser.add_argument('--countback-processes', help=argparse.SUPPRESS, type=int, default=1)
 		parser.add_argument('--npr', help='Generate a list of winners', action='store_true')
 		
 		return parser
 	
 	@classmethod
 	def main(cls):
-		from .utils import blt
-		
 		print('=== pyRCV {} ==='.format(version.VERSION))
 		print()
 		
 		parser = cls.getParser()
 		args = parser.parse_args()
 		
-		# Read blt
-		with open(args.election, 'r') as electionFile:
-			electionLines = electionFile.read().splitlines()
-			ballots, candidates, args.seats = blt.readBLT(electionLines)
+		cls.setNums(args)
+		
+		prof = cls.makeProfiler(args)
+		with prof.phase('parse'):
+			ballots, candidates, args.seats = cls.readElection(args)
+			prof.count(ballots=ballots.numLoaded)
 		
 		counter = cls(ballots, candidates, **vars(args))
+		counter.profiler = prof
 		
 		if args.verbose:
 			for ballot in ballots:
@@ -65,19 +73,24 @@ class IRVCounter(stv.STVCounter):
 			elected, _, exhausted = counter.countVotes()
 			nprElected.extend(elected)
 			counter.candidates.remove(elected[0])
+		counter.close()
+		prof.afterCount()
 		
-		print()
-		print("== TALLY COMPLETE")
-		print()
-		print("The winners are, in order of election:")
-		
-		print()
-		for candidate in nprElected:
-			print("     {}".format(candidate.name))
-		print()
+		with prof.phase('output'):
+			print()
+			print("== TALLY COMPLETE")
+			print()
+			print("The winners are, in order of election:")
+			
+			print()
+			for candidate in nprElected:
+				print("     {}".format(candidate.name))
+			print()
+			
+			if not args.npr:
+				print("---- Exhausted: {}".format(counter.toNum(exhausted)))
 		
-		if not args.npr:
-			print("---- Exhausted: {}".format(counter.toNum(exhausted)))
+		counter.writeProfile(args, prof)
 		
 		print()
 		print("=== Tally computed by pyRCV {} ===".format(version.VERSION))
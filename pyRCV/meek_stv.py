@@ -16,15 +16,36 @@
 
 # I love the smell of Python 3 in the morning
 
-import itertools
-
-from .utils import common
-from .stv import STVResult
+from .utils import events
 from . import stv
 from . import utils
-from . import version
 
 class MeekSTVCounter(stv.STVCounter):
+	# Surpluses are distributed by keep value, so individual ballots need not be tracked
+	trackBallots = False
+	
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		
+		self.preferenceMatrix = None
+		if self.args.get('numpy', False):
+			if utils._numclass is not float:
+				raise ValueError('The NumPy backend requires --nums float')
+			from .utils import vectorised
+			self.preferenceMatrix = vectorised.PreferenceMatrix(self.ballots)
+		if self.args.get('incremental', False):
+			raise ValueError('Meek STV cannot distribute preferences incrementally, as keep values change')
+	
+	def distributePreferences(self, ballots, remainingCandidates):
+		if self.preferenceMatrix is None or ballots is not self.ballots:
+			return super().distributePreferences(ballots, remainingCandidates)
+		
+		totals, exhausted = self.preferenceMatrix.distribute(self.getKeepValues(ballots, remainingCandidates))
+		self.profiler.count(ballots=len(ballots))
+		for candidate in remainingCandidates:
+			candidate.ctvv += float(totals[candidate.index])
+		return exhausted
+	
 	def countDistributeSurpluses(self, remainingCandidates, provisionallyElected, quota, roundProvisionallyElected):
 		mostVotesElected = sorted(roundProvisionallyElected, key=lambda k: k.ctvv, reverse=True)
 		self.infoLog('---- Distributing surpluses')
@@ -32,7 +53,8 @@ class MeekSTVCounter(stv.STVCounter):
 		while mostVotesElected and any(abs(c.ctvv - quota) > utils.num('0.00001') for c in mostVotesElected):
 			# Recalculate weights
 			for candidate in mostVotesElected:
-				self.verboseLog('     Reducing {} keep value from {} to {}', candidate.name, self.toNum(candidate.keep_value), self.toNum(candidate.keep_value * quota / candidate.ctvv))
+				if self.events.detailed:
+					self.events.emit(events.KeepValue(candidate, candidate.keep_value, candidate.keep_value * quota / candidate.ctvv))
 				candidate.keep_value *= quota / candidate.ctvv
 			
 			# Redistribute votes
@@ -40,19 +62,21 @@ class MeekSTVCounter(stv.STVCounter):
 			#	candidate.ctvv = utils.num('0')
 			#	candidate.ballots.clear()
 			self.resetCount(remainingCandidates)
-			roundExhausted = self.distributePreferences(self.ballots, remainingCandidates)
+			with self.profiler.phase('meek-iteration'):
+				roundExhausted = self.distributePreferences(self.ballots, remainingCandidates)
 			
 			quota = self.calcQuota(remainingCandidates)
+			self.emit(events.QuotaUpdate(quota))
 			
 			# Check again for election
 			remainingCandidates.sort(key=lambda k: k.ctvv, reverse=True)
 			for candidate in remainingCandidates:
-				if candidate not in (provisionallyElected + roundProvisionallyElected) and self.hasQuota(candidate, quota):
-					self.infoLog("**** {} provisionally elected", candidate.name)
-					roundProvisionallyElected.append(candidate)
+				if not self.states.isElected(candidate) and self.hasQuota(candidate, quota):
+					self.emit(events.Election(candidate, candidate.ctvv))
+					self.provisionallyElect(candidate, roundProvisionallyElected)
 			
 			if self.args.get('fast', False) and (len(provisionallyElected) + len(roundProvisionallyElected)) >= self.args['seats']:
-				return STVResult([], roundProvisionallyElected, roundExhausted, {cand: cand.ctvv for cand in remainingCandidates})
+				return roundProvisionallyElected
 			
 			mostVotesElected = sorted(roundProvisionallyElected, key=lambda k: k.ctvv, reverse=True)
 		
@@ -66,17 +90,19 @@ class MeekSTVCounter(stv.STVCounter):
 		provisionallyElected = []
 		
 		while True:
-			self.infoLog()
-			self.infoLog("== COUNT {}".format(count))
+			self.profiler.round = count
+			self.emit(events.Round(count))
 			
 			self.resetCount(remainingCandidates)
-			self.exhausted = self.distributePreferences(self.ballots, remainingCandidates)
+			with self.profiler.phase('distribute'):
+				self.exhausted = self.distributePreferences(self.ballots, remainingCandidates)
 			
 			roundResult = self.countUntilExclude(remainingCandidates, provisionallyElected)
 			
 			# Process round
 			
 			self.exhausted += roundResult.exhausted
+			self.emit(events.Tally(roundResult.tally, self.exhausted))
 			
 			if roundResult.excluded:
 				# Reset and reiterate
@@ -84,13 +110,16 @@ class MeekSTVCounter(stv.STVCounter):
 					candidate.keep_value = utils.num('0')
 					remainingCandidates.remove(candidate)
 				
+				# Candidates elected this round will be elected afresh after the restart
+				self.states.reset(remainingCandidates, provisionallyElected)
+				
 				if self.args['fast'] and len(remainingCandidates) <= self.args['seats']:
 					remainingCandidates.sort(key=lambda k: k.ctvv, reverse=True)
 					for candidate in remainingCandidates:
-						if candidate not in provisionallyElected:
-							print("**** {} provisionally elected on {} votes".format(candidate.name, self.toNum(candidate.ctvv)))
-							provisionallyElected.append(candidate)
-					return provisionallyElected, self.exhausted
+						if not self.states.isElected(candidate):
+							self.emit(events.ElectionOnVotes(candidate, candidate.ctvv))
+							self.provisionallyElect(candidate, provisionallyElected)
+					return provisionallyElected, [self.toNum(candidate.keep_value) for candidate in provisionallyElected], self.exhausted
 				
 				count += 1
 				
@@ -110,5 +139,18 @@ class MeekSTVCounter(stv.STVCounter):
 			
 			return provisionallyElected, [self.toNum(candidate.keep_value) for candidate in provisionallyElected], self.exhausted
 
+	@classmethod
+	def setNums(cls, args):
+		if args.nums == 'fixed':
+			raise ValueError('Meek STV cannot use fixed-point arithmetic, as rounding each ballot\'s share loses votes on every iteration, so keep values never settle')
+		super().setNums(args)
+	
+	@classmethod
+	def getParser(cls):
+		parser = super().getParser()
+		parser.add_argument('--numpy', help='Distribute preferences using NumPy (requires --nums float)', action='store_true')
+		
+		return parser
+
 if __name__ == '__main__':
 	MeekSTVCounter.main()
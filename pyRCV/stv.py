@@ -17,13 +17,15 @@
 # I love the smell of Python 3 in the morning
 
 from .utils import common
+from .utils import events
+from .utils import profiler
 from . import utils
 from . import version
 
 import base64
-import itertools
 import json
 import math
+import sys
 
 # Represents the outcome of the current round
 class STVResult:
@@ -33,12 +35,22 @@ class STVResult:
 		self.exhausted = exhausted
 		self.tally = tally
 
+# Raised when a tie for exclusion cannot be broken by any of the given methods
+class UnresolvedTieError(Exception):
+	pass
+
 class STVCounter:
+	# Whether candidate.ballots must be populated when distributing preferences
+	trackBallots = True
+	
 	def __init__(self, ballots, candidates, **kwargs):
 		self.args = kwargs
 		
-		self.ballots = ballots
 		self.candidates = candidates
+		if isinstance(ballots, common.BallotSet):
+			self.ballots = ballots
+		else:
+			self.ballots = common.BallotSet.fromBallots(ballots, candidates)
 		
 		self.exhausted = utils.num('0')
 		
@@ -50,10 +62,44 @@ class STVCounter:
 			if self.args.get('randbyte', None):
 				self.randbyte = int(self.args['randbyte'])
 		
-		self.tally_history = []
+		self.tally_history = common.TallyHistory(self.ballots.candidates)
+		
+		self.ballotTrie = None
+		self.distributor = None
+		
+		# Cached allocation of ballots before any surplus transfers, for --incremental
+		self.firstStage = None # candidate index -> [(ballot index, value)], in ballot order
+		self.firstStageVotes = None # candidate index -> total value
+		self.firstStagePosition = None # ballot index -> position in self.ballots.preferences
+		self.firstStageExhausted = None # [(ballot index, value)], in ballot order
+		
+		self.states = common.CandidateStates(self.ballots.candidates)
+		
+		# Replaced with a profiler.Profiler to record the phases of the count
+		self.profiler = profiler.NullProfiler()
+		
+		self.events = events.EventLog()
+		self.events.attach(events.TextSink(self.toNum, detailed=self.args.get('verbose', False), summary=not self.args.get('quiet', False)))
+		if self.args.get('events', None):
+			self.events.attach(events.JSONLSink(open(self.args['events'], 'w')))
+		if self.args.get('denominator_report', None):
+			from .utils import denominators
+			self.events.attach(denominators.DenominatorSink(self, self.args['denominator_report']))
+	
+	# Whether distributing preferences across worker processes could be faster than a serial count
+	def canShard(self):
+		from .utils import parallel
+		return parallel.shardingObstacle(self.trackBallots, self.args.get('shard_subtotals', False)) is None
+	
+	# Release any worker processes, and flush the event sinks
+	def close(self):
+		if self.distributor is not None:
+			self.distributor.close()
+			self.distributor = None
+		self.events.close()
 	
 	def log(self, string='', *args):
-		print(string.format(*args))
+		self.emit(events.Message(string.format(*args)))
 	
 	def verboseLog(self, string='', *args):
 		if self.args.get('verbose', False):
@@ -63,36 +109,229 @@ class STVCounter:
 		if not self.args.get('quiet', False):
 			self.log(string, *args)
 	
+	# Events concerning individual ballots should instead be guarded by self.events.detailed, so they are not constructed needlessly
+	def emit(self, event):
+		if self.events:
+			self.events.emit(event)
+	
 	def resetCount(self, candidates):
 		for candidate in candidates:
 			candidate.ctvv = utils.num('0')
 			candidate.ballots.clear()
+			candidate.parcels.clear()
+	
+	def getKeepValues(self, ballots, remainingCandidates):
+		# Keep values by candidate index, zero for candidates no longer in the count
+		keepValues = [utils.num('0')] * len(ballots.candidates)
+		for candidate in remainingCandidates:
+			keepValues[candidate.index] = candidate.keep_value
+		return keepValues
 	
 	def distributePreferences(self, ballots, remainingCandidates):
-		exhausted = utils.num('0')
+		if self.args.get('incremental', False) and ballots is self.ballots:
+			return self.distributePreferencesIncremental(ballots, remainingCandidates)
+		
+		if self.args.get('trie', False):
+			return self.distributePreferencesTrie(ballots, remainingCandidates)
+		
+		# Per-ballot logging must happen in order, so is only available in a serial count
+		if self.args.get('processes', 1) > 1 and ballots is self.ballots and not self.events.detailed and self.canShard():
+			if self.distributor is None:
+				from .utils import parallel
+				self.distributor = parallel.ShardedDistributor(ballots, self.args['processes'], self.args.get('shard_subtotals', False))
+			self.profiler.count(ballots=len(ballots))
+			return self.distributor.distribute(self.getKeepValues(ballots, remainingCandidates), self.trackBallots)
 		
-		for ballot in ballots:
-			assigned = utils.num('0')
-			last_preference = None
-			for preference in ballot.preferences:
-				if preference in self.candidates and preference.keep_value > utils.num('0'):
-					value = (ballot.value - assigned) * preference.keep_value
+		exhausted = utils.num('0')
+		zero = utils.num('0')
+		
+		keepValues = self.getKeepValues(ballots, remainingCandidates)
+		detailed = self.events.detailed
+		
+		candidates = ballots.candidates
+		offsets = ballots.offsets
+		preferences = ballots.preferences
+		values = ballots.values
+		operations = 0
+		
+		for i in range(len(values)):
+			ballotValue = values[i]
+			assigned = zero
+			start = offsets[i]
+			for position in range(start, offsets[i + 1]):
+				index = preferences[position]
+				keepValue = keepValues[index]
+				if keepValue > zero:
+					preference = candidates[index]
+					value = (ballotValue - assigned) * keepValue
 					
-					self.verboseLog('   - Assigning {} of {} votes to {} at value {} via {}', self.toNum(ballot.value - assigned), self.toNum(ballot.value), preference.name, self.toNum(preference.keep_value), ballot.prettyPreferences)
+					if detailed:
+						self.events.emit(events.Assignment(preference, ballotValue - assigned, ballotValue, keepValue, ballots.ballot(i).prettyPreferences))
 					
 					preference.ctvv += value
 					assigned += value
-					preference.ballots.append(common.CandidateBallot(ballot, value))
+					operations += 4
+					if self.trackBallots:
+						preference.ballots.append(common.CandidateBallot(ballots.ballot(i), value, position - start))
 				
-				if assigned >= ballot.value:
+				if assigned >= ballotValue:
 					break
 			
-			if assigned < ballot.value:
-				self.verboseLog('   - Exhausted {} votes via {}', self.toNum(ballot.value - assigned), ballot.prettyPreferences)
-				exhausted += ballot.value - assigned
+			if assigned < ballotValue:
+				if detailed:
+					self.events.emit(events.Exhaustion(ballotValue - assigned, ballots.ballot(i).prettyPreferences))
+				exhausted += ballotValue - assigned
+				operations += 2
+		
+		self.profiler.count(ballots=len(values), operations=operations)
+		return exhausted
+	
+	# As distributePreferences, but each distinct prefix of preferences is evaluated only once
+	def distributePreferencesTrie(self, ballots, remainingCandidates):
+		if ballots is self.ballots:
+			if self.ballotTrie is None:
+				self.ballotTrie = common.BallotTrie(ballots)
+			trie = self.ballotTrie
+		else:
+			trie = common.BallotTrie(ballots)
+		
+		exhausted = trie.root.ending
+		zero = utils.num('0')
+		one = utils.num('1')
+		
+		keepValues = self.getKeepValues(ballots, remainingCandidates)
+		detailed = self.events.detailed
+		
+		candidates = ballots.candidates
+		order = trie.order
+		values = ballots.values
+		
+		operations = 0
+		
+		# (node, fraction of each ballot's value not yet assigned, depth)
+		stack = [(node, one, 1) for node in reversed(trie.root.children)]
+		while stack:
+			node, remaining, depth = stack.pop()
+			
+			keepValue = keepValues[node.candidate]
+			if keepValue > zero:
+				preference = candidates[node.candidate]
+				value = node.votes * remaining * keepValue
+				
+				if detailed:
+					self.events.emit(events.Assignment(preference, node.votes * remaining, node.votes, keepValue, trie.prettyPrefix(node, depth)))
+				
+				preference.ctvv += value
+				if self.trackBallots:
+					for i in order[node.lo:node.hi]:
+						preference.ballots.append(common.CandidateBallot(ballots.ballot(i), values[i] * remaining * keepValue, depth - 1))
+				
+				remaining = remaining * (one - keepValue)
+				operations += 5
+				if remaining <= zero:
+					continue
+			
+			if node.ending > zero:
+				if detailed:
+					self.events.emit(events.Exhaustion(node.ending * remaining, trie.prettyPrefix(node, depth)))
+				exhausted += node.ending * remaining
+				operations += 2
+			
+			for child in reversed(node.children):
+				stack.append((child, remaining, depth + 1))
 		
+		self.profiler.count(ballots=len(values), operations=operations)
 		return exhausted
 	
+	# As distributePreferences, but reusing the allocation from the previous call, and moving only the ballots of candidates removed since
+	# This requires every keep value to be 1 or 0, as under Wright STV or IRV
+	def distributePreferencesIncremental(self, ballots, remainingCandidates):
+		if self.firstStage is None:
+			self.buildFirstStage(remainingCandidates)
+		else:
+			self.updateFirstStage(remainingCandidates)
+		
+		for candidate in remainingCandidates:
+			candidate.ctvv = self.firstStageVotes.get(candidate.index, utils.num('0'))
+			if self.trackBallots:
+				candidate.ballots = [common.CandidateBallot(ballots.ballot(i), value, self.firstStagePosition[i] - ballots.offsets[i]) for i, value in self.firstStage.get(candidate.index, [])]
+		
+		exhausted = utils.num('0')
+		for i, value in self.firstStageExhausted:
+			exhausted += value
+		return exhausted
+	
+	# Each ballot sits wholly with its first remaining preference
+	def buildFirstStage(self, remainingCandidates):
+		ballots = self.ballots
+		keepValues = self.getKeepValues(ballots, remainingCandidates)
+		
+		self.firstStage = {}
+		self.firstStagePosition = {}
+		self.firstStageExhausted = []
+		for i in range(len(ballots)):
+			self.placeBallot(i, ballots.offsets[i], keepValues)
+		self.profiler.count(ballots=len(ballots))
+		
+		self.firstStageVotes = {}
+		for index in self.firstStage:
+			self.sumFirstStage(index)
+	
+	# Move only those ballots sitting with candidates who have since been excluded
+	def updateFirstStage(self, remainingCandidates):
+		ballots = self.ballots
+		keepValues = self.getKeepValues(ballots, remainingCandidates)
+		zero = utils.num('0')
+		
+		moved = []
+		for index in [x for x in self.firstStage if not keepValues[x] > zero]:
+			moved.extend(i for i, value in self.firstStage.pop(index))
+			del self.firstStageVotes[index]
+		
+		affected = set()
+		numExhausted = len(self.firstStageExhausted)
+		self.profiler.count(ballots=len(moved))
+		detailed = self.events.detailed
+		for i in sorted(moved):
+			index = self.placeBallot(i, self.firstStagePosition[i] + 1, keepValues)
+			if index is None:
+				if detailed:
+					self.events.emit(events.Exhaustion(ballots.values[i], ballots.ballot(i).prettyPreferences))
+			else:
+				if detailed:
+					self.events.emit(events.Reassignment(ballots.candidates[index], ballots.values[i], ballots.ballot(i).prettyPreferences))
+				affected.add(index)
+		
+		# Restore ballot order, so that totals are summed exactly as in a full redistribution
+		for index in affected:
+			self.firstStage[index].sort(key=lambda x: x[0])
+			self.sumFirstStage(index)
+		if len(self.firstStageExhausted) > numExhausted:
+			self.firstStageExhausted.sort(key=lambda x: x[0])
+	
+	# Allocate ballot i to its first preference with a non-zero keep value, at or after the given position
+	def placeBallot(self, i, position, keepValues):
+		ballots = self.ballots
+		zero = utils.num('0')
+		ballotValue = ballots.values[i]
+		
+		for position in range(position, ballots.offsets[i + 1]):
+			index = ballots.preferences[position]
+			if keepValues[index] > zero:
+				self.firstStage.setdefault(index, []).append((i, (ballotValue - zero) * keepValues[index]))
+				self.firstStagePosition[i] = position
+				return index
+		
+		self.firstStageExhausted.append((i, ballotValue - zero))
+		return None
+	
+	def sumFirstStage(self, index):
+		votes = utils.num('0')
+		for i, value in self.firstStage[index]:
+			votes += value
+		self.profiler.count(operations=len(self.firstStage[index]))
+		self.firstStageVotes[index] = votes
+	
 	def toNum(self, num):
 		if self.args.get('noround', False):
 			return str(num)
@@ -101,8 +340,8 @@ class STVCounter:
 	
 	def totalVoteBallots(self, ballots):
 		tv = utils.num('0')
-		for ballot in ballots:
-			tv += ballot.value
+		for value in ballots.values:
+			tv += value
 		return tv
 	
 	def totalVote(self, candidates):
@@ -129,44 +368,91 @@ class STVCounter:
 		if 'geq-' in self.args['quota']:
 			return candidate.ctvv >= quota
 	
-	# Return the candidate to transfer votes to for surpluses or exclusion
-	def surplusTransfer(self, preferences, fromCandidate, provisionallyElected, remainingCandidates):
-		beginPreference = preferences.index(fromCandidate)
-		for index in range(beginPreference + 1, len(preferences)):
-			preference = preferences[index]
-			if preference in remainingCandidates and preference not in provisionallyElected:
-				return preference
-		return False
+	# Return the position in the ballot's preferences of the candidate to transfer it to for surpluses or exclusion, or None if it is exhausted
+	# Scanning resumes from the candidate currently holding the ballot: candidates before it are already elected or excluded, and so can never again receive it
+	def surplusTransfer(self, ballot, fromCandidate):
+		preferences = ballot.ballot.preferences
+		if ballot.position is None:
+			ballot.position = preferences.index(fromCandidate)
+		status = self.states.status
+		for position in range(ballot.position + 1, len(preferences)):
+			if status[preferences[position].index] == common.CandidateStatus.HOPEFUL:
+				return position
+		return None
 	
-	def printVotes(self, remainingCandidates, provisionallyElected):
+	# Return the candidate's parcels, gathering any ballots not yet in a parcel into one at full value
+	def parcelsOf(self, candidate):
+		if candidate.ballots:
+			candidate.parcels.append(common.Parcel(candidate.ballots, utils.num('1')))
+			candidate.ballots = []
+		return candidate.parcels
+	
+	# Split the candidate's parcels by the candidate each ballot transfers to, optionally scaling each parcel's value by the multiplier
+	# Returns a list of (candidate to transfer to, or None if exhausted, new parcel); parcels with the same destination and value are merged
+	# Ballot objects are moved into the new parcels rather than copied. A surplus leaves them also in the elected candidate's parcels for countbacks, but that candidate never transfers them again.
+	def splitParcels(self, candidate, multiplier=None):
+		groups = {}
+		for parcel in self.parcelsOf(candidate):
+			value = parcel.value if multiplier is None else parcel.value * multiplier
+			# The multiplication, and the sum of the weights of the ballots in the new parcels
+			self.profiler.count(ballots=len(parcel.ballots), operations=1 + len(parcel.ballots))
+			# Group by destination within the parcel first, as hashing the value for every ballot is costly with large denominators
+			destinations = {}
+			for ballot in parcel.ballots:
+				position = self.surplusTransfer(ballot, candidate)
+				if position is None:
+					transferTo = None
+				else:
+					transferTo = ballot.ballot.preferences[position]
+					ballot.position = position
+				index = None if transferTo is None else transferTo.index
+				if index not in destinations:
+					destinations[index] = (transferTo, [])
+				destinations[index][1].append(ballot)
+			for index, (transferTo, ballots) in destinations.items():
+				key = (index, value)
+				if key in groups:
+					groups[key][1].extend(ballots)
+				else:
+					groups[key] = (transferTo, ballots)
+		return [(transferTo, common.Parcel(ballots, key[1])) for key, (transferTo, ballots) in groups.items()]
+	
+	def provisionallyElect(self, candidate, provisionallyElected):
+		provisionallyElected.append(candidate)
+		self.states.elect(candidate)
+	
+	# Sort remainingCandidates by votes, highest first, and print them
+	def printVotes(self, remainingCandidates):
 		remainingCandidates.sort(key=lambda k: k.ctvv, reverse=True)
+		if self.args.get('quiet', False):
+			return
 		self.infoLog()
 		for candidate in remainingCandidates:
-			self.infoLog('    {}{}: {}', '*' if candidate in provisionallyElected else ' ', candidate.name, self.toNum(candidate.ctvv))
+			self.infoLog('    {}{}: {}', '*' if self.states.isElected(candidate) else ' ', candidate.name, self.toNum(candidate.ctvv))
 		self.infoLog()
 	
 	def countUntilSurpluses(self, remainingCandidates, provisionallyElected):
 		roundProvisionallyElected = []
 		roundExhausted = utils.num('0')
 		
-		self.printVotes(remainingCandidates, provisionallyElected)
+		self.printVotes(remainingCandidates)
 		
 		quota = self.calcQuota(remainingCandidates)
 		
 		self.infoLog('---- Total Votes: {}', self.toNum(self.totalBallots))
 		self.infoLog('----   Of which not exhausted: {}', self.toNum(self.totalVote(remainingCandidates)))
 		self.infoLog('----   Of which exhausted: {}', self.toNum(self.exhausted + roundExhausted))
-		self.infoLog('---- Quota: {}', self.toNum(quota))
+		self.emit(events.Quota(quota))
 		self.infoLog()
 		
-		remainingCandidates.sort(key=lambda k: k.ctvv, reverse=True)
+		# printVotes has sorted remainingCandidates, highest first
 		
 		# If "slow" IRV, skip this step, otherwise continue
 		if self.args.get('fast', False) or self.args['seats'] > 1:
 			for candidate in remainingCandidates:
-				if candidate not in (provisionallyElected + roundProvisionallyElected) and self.hasQuota(candidate, quota):
-					self.infoLog("**** {} provisionally elected", candidate.name)
-					roundProvisionallyElected.append(candidate)
+				if not self.states.isElected(candidate) and self.hasQuota(candidate, quota):
+					self.emit(events.Election(candidate, candidate.ctvv))
+					self.provisionallyElect(candidate, roundProvisionallyElected)
 		
 		return quota, roundProvisionallyElected, roundExhausted
 	
@@ -177,30 +463,75 @@ class STVCounter:
 			for candidate in mostVotesElected:
 				if candidate.ctvv > quota:
 					multiplier = (candidate.ctvv - quota) / candidate.ctvv
-					self.infoLog('---- Transferring surplus from {} at value {}', candidate.name, self.toNum(multiplier))
+					self.emit(events.SurplusTransfer(candidate, multiplier))
 					
-					for ballot in candidate.ballots:
-						transferTo = self.surplusTransfer(ballot.ballot.preferences, candidate, provisionallyElected + roundProvisionallyElected, remainingCandidates)
-						if transferTo == False:
-							self.verboseLog('   - Exhausted {} votes via {}', self.toNum(ballot.value), ballot.ballot.prettyPreferences)
-							ballot.value *= (1 - multiplier)
-							# roundExhausted += ballot.value * multiplier
-							# Since it retains its value and remains in the count, we will not count it as exhausted.
-						else:
-							self.verboseLog('   - Transferring {} votes to {} via {}', self.toNum(ballot.value), transferTo.name, ballot.ballot.prettyPreferences)
-							newBallot = common.CandidateBallot(ballot.ballot, ballot.value * multiplier)
-							ballot.value *= (1 - multiplier)
-							transferTo.ctvv += newBallot.value
-							transferTo.ballots.append(newBallot)
+					detailed = self.events.detailed
+					if self.args.get('parcels', False):
+						for transferTo, parcel in self.splitParcels(candidate, multiplier):
+							if transferTo is None:
+								# As below, exhausted ballots retain their value with the elected candidate
+								if detailed:
+									self.events.emit(events.ParcelExhaustion(len(parcel.ballots), parcel.value, candidate))
+							else:
+								if detailed:
+									self.events.emit(events.ParcelTransfer(transferTo, len(parcel.ballots), parcel.value, candidate))
+								transferTo.ctvv += parcel.votes
+								self.parcelsOf(transferTo).append(parcel)
+								self.profiler.count(operations=2)
+						for parcel in candidate.parcels:
+							parcel.value *= (1 - multiplier)
+						self.profiler.count(operations=2 * len(candidate.parcels))
+					else:
+						operations = 0
+						remainder = 1 - multiplier
+						# With exact arithmetic, ballots sharing a value share the products, and the votes transferred to each candidate are summed over a common denominator
+						exact = utils.exact()
+						products = {}
+						transferred = {}
+						for ballot in candidate.ballots:
+							if exact:
+								if ballot.value not in products:
+									products[ballot.value] = (ballot.value * multiplier, ballot.value * remainder)
+									operations += 2
+								transferValue, keptValue = products[ballot.value]
+							else:
+								transferValue, keptValue = None, ballot.value * remainder
+								operations += 1
+							
+							position = self.surplusTransfer(ballot, candidate)
+							if position is None:
+								if detailed:
+									self.events.emit(events.Exhaustion(ballot.value, ballot.ballot.prettyPreferences, candidate))
+								ballot.value = keptValue
+								operations += 1
+								# roundExhausted += ballot.value * multiplier
+								# Since it retains its value and remains in the count, we will not count it as exhausted.
+							else:
+								transferTo = ballot.ballot.preferences[position]
+								if detailed:
+									self.events.emit(events.Transfer(transferTo, ballot.value, ballot.ballot.prettyPreferences, candidate))
+								if exact:
+									newBallot = common.CandidateBallot(ballot.ballot, transferValue, position)
+									transferred.setdefault(transferTo, []).append(transferValue)
+								else:
+									newBallot = common.CandidateBallot(ballot.ballot, ballot.value * multiplier, position)
+									transferTo.ctvv += newBallot.value
+									operations += 2
+								ballot.value = keptValue
+								transferTo.ballots.append(newBallot)
+						for transferTo, values in transferred.items():
+							transferTo.ctvv += common.sumValues(values)
+							operations += len(values)
+						self.profiler.count(ballots=len(candidate.ballots), operations=operations)
 					
 					candidate.ctvv = quota
 					
-					self.printVotes(remainingCandidates, provisionallyElected + roundProvisionallyElected)
+					self.printVotes(remainingCandidates)
 					
 					for candidate in remainingCandidates:
-						if candidate not in (provisionallyElected + roundProvisionallyElected) and self.hasQuota(candidate, quota):
-							self.infoLog('**** {} provisionally elected', candidate.name)
-							roundProvisionallyElected.append(candidate)
+						if not self.states.isElected(candidate) and self.hasQuota(candidate, quota):
+							self.emit(events.Election(candidate, candidate.ctvv))
+							self.provisionallyElect(candidate, roundProvisionallyElected)
 					
 					if self.args.get('fast', False) and (len(provisionallyElected) + len(roundProvisionallyElected)) >= self.args['seats']:
 						return roundProvisionallyElected
@@ -208,13 +539,52 @@ class STVCounter:
 		
 		return roundProvisionallyElected
 	
+	# Return the most hopeful candidates, lowest first, who can be excluded together, or an empty list
+	# Candidates can be excluded together if their total votes are less than those of the next lowest candidate, and could not bring any candidate to the quota
+	# remainingCandidates must be sorted by votes, lowest first
+	def planBulkExclusion(self, remainingCandidates, quota):
+		# Hopeful candidates with equal votes, lowest first
+		groups = []
+		for candidate in remainingCandidates:
+			if not self.states.isHopeful(candidate):
+				continue
+			if groups and candidate.ctvv == groups[-1][0].ctvv:
+				groups[-1].append(candidate)
+			else:
+				groups.append([candidate])
+		if not groups:
+			return []
+		
+		totals = [self.totalVote(group) for group in groups]
+		votesToExclude = utils.num('0')
+		for total in totals:
+			votesToExclude += total
+		
+		# Shortfall of the highest hopeful candidate from the quota
+		lowestShortfall = quota - groups[-1][0].ctvv
+		
+		# Try the largest exclusion first, removing the highest group until the exclusion is safe
+		for i in reversed(range(0, len(groups))):
+			# Would the total number of votes to exclude geq the next lowest candidate, or allow a candidate to reach the quota?
+			if (i + 1 < len(groups) and votesToExclude >= groups[i + 1][0].ctvv) or votesToExclude >= lowestShortfall:
+				votesToExclude -= totals[i]
+				continue
+			
+			return [candidate for group in groups[:i + 1] for candidate in group]
+		
+		return []
+	
 	def countUntilExclude(self, remainingCandidates, provisionallyElected):
-		quota, roundProvisionallyElected, roundExhausted = self.countUntilSurpluses(remainingCandidates, provisionallyElected)
+		self.states.reset(remainingCandidates, provisionallyElected)
+		
+		with self.profiler.phase('count-until-surpluses'):
+			quota, roundProvisionallyElected, roundExhausted = self.countUntilSurpluses(remainingCandidates, provisionallyElected)
 		
 		if self.args.get('fast', False) and (len(provisionallyElected) + len(roundProvisionallyElected)) >= self.args['seats']:
 			return STVResult([], roundProvisionallyElected, roundExhausted, {cand: cand.ctvv for cand in remainingCandidates})
 		
-		roundProvisionallyElected = self.countDistributeSurpluses(remainingCandidates, provisionallyElected, quota, roundProvisionallyElected)
+		with self.profiler.phase('distribute-surpluses'):
+			roundProvisionallyElected = self.countDistributeSurpluses(remainingCandidates, provisionallyElected, quota, roundProvisionallyElected)
 		
 		if self.args.get('fast', False) and (len(provisionallyElected) + len(roundProvisionallyElected)) >= self.args['seats']:
 			return STVResult([], roundProvisionallyElected, roundExhausted, {cand: cand.ctvv for cand in remainingCandidates})
@@ -224,47 +594,18 @@ class STVCounter:
 		if not self.args.get('fast', False) and len(remainingCandidates) <= self.args['seats']:
 			remainingCandidates.sort(key=lambda k: k.ctvv, reverse=True)
 			for candidate in remainingCandidates:
-				if candidate not in (provisionallyElected + roundProvisionallyElected):
-					self.infoLog('**** {} provisionally elected on {} quotas', candidate.name, self.toNum(candidate.ctvv / quota))
-					roundProvisionallyElected.append(candidate)
+				if not self.states.isElected(candidate):
+					self.emit(events.ElectionOnQuotas(candidate, candidate.ctvv, candidate.ctvv / quota))
+					self.provisionallyElect(candidate, roundProvisionallyElected)
 			return STVResult([], roundProvisionallyElected, roundExhausted, {cand: cand.ctvv for cand in remainingCandidates})
 		
 		# Bulk exclude as many candidates as possible
 		remainingCandidates.sort(key=lambda k: k.ctvv)
-		grouped = [(x, list(y)) for x, y in itertools.groupby([x for x in remainingCandidates if x not in (provisionallyElected + roundProvisionallyElected)], lambda k: k.ctvv)] # ily python
-		
-		votesToExclude = utils.num('0')
-		for i in range(0, len(grouped)):
-			key, group = grouped[i]
-			votesToExclude += self.totalVote(group)
-		
-		candidatesToExclude = []
-		for i in reversed(range(0, len(grouped))):
-			key, group = grouped[i]
-			
-			# Would the total number of votes to exclude geq the next lowest candidate?
-			if len(grouped) > i + 1 and votesToExclude >= float(grouped[i + 1][0]):
-				votesToExclude -= self.totalVote(group)
-				continue
-			
-			# Would the total number of votes to exclude allow a candidate to reach the quota?
-			lowestShortfall = float('inf')
-			for candidate in remainingCandidates:
-				if candidate not in (provisionallyElected + roundProvisionallyElected) and (quota - candidate.ctvv < lowestShortfall):
-					lowestShortfall = quota - candidate.ctvv
-			if votesToExclude >= lowestShortfall:
-				votesToExclude -= self.totalVote(group)
-				continue
-			
-			# Still here? Okay!
-			candidatesToExclude = []
-			for j in range(0, i + 1):
-				key, group = grouped[j]
-				candidatesToExclude.extend(group)
+		candidatesToExclude = self.planBulkExclusion(remainingCandidates, quota)
 		
 		if candidatesToExclude:
 			for candidate in candidatesToExclude:
-				self.infoLog('---- Bulk excluding {}', candidate.name)
+				self.emit(events.BulkExclusion(candidate))
 			return STVResult(candidatesToExclude, roundProvisionallyElected, roundExhausted, {cand: cand.ctvv for cand in remainingCandidates})
 		else:
 			# Just exclude one candidate then
@@ -286,17 +627,14 @@ class STVCounter:
 					if tie_method is None:
 						self.log("---- No resolution for tie, and no further tie-breaking methods specified")
 						self.log("---- Tie enable manual breaking of ties, append 'manual' to the --ties option")
-						return False
+						raise UnresolvedTieError('Unable to break a tie between {}'.format(', '.join(x.name for x in tiedCandidates)))
 					
 					if tie_method == 'backward':
 						# Was there a previous round where any tied candidate was behind the others?
-						for previous_tally in reversed(self.tally_history):
-							prev_tally_min = min(prev_ctvv for cand, prev_ctvv in previous_tally.items() if cand in tiedCandidates)
-							prev_lowest = [cand for cand, prev_ctvv in previous_tally.items() if prev_ctvv == prev_tally_min]
-							if len(prev_lowest) == 1:
-								self.log("---- Tie broken backwards")
-								toExclude = remainingCandidates.index(prev_lowest[0])
-								break # inner for
+						prev_lowest = self.tally_history.lowestBackward(tiedCandidates)
+						if prev_lowest is not None:
+							self.log("---- Tie broken backwards")
+							toExclude = remainingCandidates.index(prev_lowest)
 					
 					if tie_method == 'random':
 						self.log("---- Tie broken randomly")
@@ -315,7 +653,7 @@ class STVCounter:
 						else:
 							self.log("---- Excluding all tied candidates")
 							for candidate in tiedCandidates:
-								self.infoLog('---- Excluding {}', candidate.name)
+								self.emit(events.Exclusion(candidate))
 							return STVResult(tiedCandidates, roundProvisionallyElected, roundExhausted, {cand: cand.ctvv for cand in remainingCandidates})
 					
 					if tie_method == 'manual':
@@ -326,9 +664,42 @@ class STVCounter:
 				# No tie. Exclude the lowest candidate
 				toExclude = 0
 			
-			self.infoLog('---- Excluding {}', remainingCandidates[toExclude].name)
+			self.emit(events.Exclusion(remainingCandidates[toExclude]))
 			return STVResult([remainingCandidates[toExclude]], roundProvisionallyElected, roundExhausted, {cand: cand.ctvv for cand in remainingCandidates})
 	
+	# Transfer the ballots of the given excluded candidates to their next available preferences
+	def transferExcluded(self, excluded):
+		detailed = self.events.detailed
+		for candidate in excluded:
+			if self.args.get('parcels', False):
+				for transferTo, parcel in self.splitParcels(candidate):
+					if transferTo is None:
+						if detailed:
+							self.events.emit(events.ParcelExhaustion(len(parcel.ballots), parcel.value, candidate))
+						self.exhausted += parcel.votes
+					else:
+						if detailed:
+							self.events.emit(events.ParcelTransfer(transferTo, len(parcel.ballots), parcel.value, candidate))
+						transferTo.ctvv += parcel.votes
+						self.parcelsOf(transferTo).append(parcel)
+					self.profiler.count(operations=2)
+				continue
+			
+			self.profiler.count(ballots=len(candidate.ballots), operations=len(candidate.ballots))
+			for ballot in candidate.ballots:
+				position = self.surplusTransfer(ballot, candidate)
+				if position is None:
+					if detailed:
+						self.events.emit(events.Exhaustion(ballot.value, ballot.ballot.prettyPreferences, candidate))
+					self.exhausted += ballot.value
+				else:
+					transferTo = ballot.ballot.preferences[position]
+					ballot.position = position
+					if detailed:
+						self.events.emit(events.Transfer(transferTo, ballot.value, ballot.ballot.prettyPreferences, candidate))
+					transferTo.ctvv += ballot.value
+					transferTo.ballots.append(ballot)
+	
 	def countVotes(self):
 		self.totalBallots = self.totalVoteBallots(self.ballots)
 		
@@ -336,12 +707,14 @@ class STVCounter:
 		remainingCandidates = self.candidates[:]
 		elected = []
 		
+		self.profiler.round = count
 		self.resetCount(remainingCandidates)
-		self.exhausted = self.distributePreferences(self.ballots, remainingCandidates)
+		with self.profiler.phase('distribute'):
+			self.exhausted = self.distributePreferences(self.ballots, remainingCandidates)
 		
 		while True:
-			self.infoLog()
-			self.infoLog('== COUNT {}', count)
+			self.profiler.round = count
+			self.emit(events.Round(count))
 			
 			roundResult = self.countUntilExclude(remainingCandidates, elected)
 			self.tally_history.append(roundResult.tally)
@@ -349,33 +722,27 @@ class STVCounter:
 			# Process round
 			
 			self.exhausted += roundResult.exhausted
+			self.emit(events.Tally(roundResult.tally, self.exhausted))
 			for candidate in roundResult.provisionallyElected:
 				elected.append(candidate)
 			
 			for candidate in roundResult.excluded:
 				remainingCandidates.remove(candidate)
-			for candidate in roundResult.excluded:
-				for ballot in candidate.ballots:
-					transferTo = self.surplusTransfer(ballot.ballot.preferences, candidate, elected, remainingCandidates)
-					if transferTo == False:
-						self.verboseLog('   - Exhausted {} votes via {}', self.toNum(ballot.value), ballot.ballot.prettyPreferences)
-						self.exhausted += ballot.value
-					else:
-						self.verboseLog('   - Transferring {} votes to {} via {}', self.toNum(ballot.value), transferTo.name, ballot.ballot.prettyPreferences)
-						transferTo.ctvv += ballot.value
-						transferTo.ballots.append(ballot)
+				self.states.exclude(candidate)
+			with self.profiler.phase('exclusion-transfers'):
+				self.transferExcluded(roundResult.excluded)
 			
 			if not self.args.get('fast', False) and roundResult.excluded:
-				self.printVotes(remainingCandidates, elected)
+				self.printVotes(remainingCandidates)
 			
 			# Are we done yet?
 			
 			if self.args.get('fast', False) and len(remainingCandidates) <= self.args['seats']:
 				remainingCandidates.sort(key=lambda k: k.ctvv, reverse=True)
 				for candidate in remainingCandidates:
-					if candidate not in elected:
-						self.infoLog('**** {} provisionally elected on {} votes', candidate.name, self.toNum(candidate.ctvv))
-						elected.append(candidate)
+					if not self.states.isElected(candidate):
+						self.emit(events.ElectionOnVotes(candidate, candidate.ctvv))
+						self.provisionallyElect(candidate, elected)
 				return elected, None, self.exhausted
 			
 			if len(elected) >= self.args['seats']:
@@ -388,21 +755,111 @@ class STVCounter:
 		import argparse
 		
 		parser = argparse.ArgumentParser(description='Count an election using STV.', conflict_handler='resolve')
-		parser.add_argument('--election', required=True, help='OpenSTV blt file')
+		parser.add_argument('--election', required=True, help='OpenSTV blt file, or compiled blt file')
+		parser.add_argument('--gamma', help='Read --election as gamma-encoded ballots, for the candidates named one per line in the given file and the given number of seats', nargs=2, metavar=('CANDIDATES', 'SEATS'))
+		parser.add_argument('--gamma-format', help='Encoding of the sums with --gamma: whitespace-separated text, or LEB128 varints', choices=['text', 'binary'], default='text')
 		parser.add_argument('--verbose', help='Display extra information', action='store_true')
 		parser.add_argument('--quiet', help='Silence all output except the bare minimum', action='store_true')
+		parser.add_argument('--events', help='Write a log of the count as JSON lines to the given file')
+		parser.add_argument('--profile-report', help='Write the time, ballots touched and operations of each phase of the count as JSON to the given file')
+		parser.add_argument('--profile-memory', help='With --profile-report, also trace the peak memory of each phase, which greatly slows the count and so distorts its times', action='store_true')
+		parser.add_argument('--denominator-report', help='With --nums fraction, write the size of the denominators of votes, ballot values and transfer values in each round as JSON to the given file')
 		parser.add_argument('--fast', help="Don't perform a full tally", action='store_true')
-		parser.add_argument('--nums', help='Kind of arithmetic to use', choices=['float', 'fraction', 'decimal'], default='fraction')
+		parser.add_argument('--nums', help='Kind of arithmetic to use', choices=['float', 'fraction', 'decimal', 'fixed'], default='fraction')
+		parser.add_argument('--decimals', help='Number of decimal places to keep with --nums fixed', type=int, default=6)
+		parser.add_argument('--rounding', help='How to reduce results to the number of decimal places with --nums fixed', choices=['truncate', 'round'], default='truncate')
 		parser.add_argument('--noround', help="Display raw fractions instead of rounded decimals", action='store_true')
+		parser.add_argument('--aggregate', help='Merge identical ballots when loading. This is the default with --nums fraction; with other kinds of arithmetic it changes the rounding of transfers, and so may change the result', action='store_true', default=None)
+		parser.add_argument('--noaggregate', help="Don't merge identical ballots when loading", dest='aggregate', action='store_false')
+		parser.add_argument('--processes', help='Distribute preferences across all ballots (each Meek iteration) across this many worker processes. Surplus and exclusion transfers remain serial. Counts which keep each candidate\'s ballots (STV, Wright STV, IRV, and any count with --countback or --vacancies), and float or Decimal counts without --shard-subtotals, cannot be sped up this way, and are counted serially with a warning', type=int, default=1)
+		parser.add_argument('--shard-subtotals', help='With --processes and float or Decimal arithmetic, add up each shard of ballots separately. This is faster, but rounds differently from a serial count, so results may differ slightly', action='store_true')
+		parser.add_argument('--trie', help='Distribute preferences using a prefix tree of ballots, evaluating shared prefixes once', action='store_true')
+		parser.add_argument('--parcels', help='Transfer ballots in parcels sharing a next preference and transfer value, as in a hand count', action='store_true')
 		parser.add_argument('--quota', help='The quota/threshold condition: >=Droop, >Hagenbach-Bischoff, etc.', choices=['geq-droop', 'gt-hb', 'geq-hb'], default='geq-droop')
 		parser.add_argument('--quota-prog', help='Use a progressively-reducing quota', action='store_true')
 		parser.add_argument('--ties', help='How to break ties, in preference order', choices=['manual', 'backward', 'random', 'all'], nargs='+', default=['manual'])
 		parser.add_argument('--randfile', help='random.org signed JSON data')
 		parser.add_argument('--randbyte', help='Index of byte in random data to start at', default='0')
 		parser.add_argument('--countback', help="Store electing quota of votes for a given candidate ID and store in a given blt file", nargs=2)
+		parser.add_argument('--vacancies', help="After the count, fill the vacancies of the given elected candidates (or 'all') by countback", nargs='+')
+		parser.add_argument('--countback-withdrawn', help='Candidates not contesting the countbacks', nargs='+', default=[])
+		parser.add_argument('--countback-processes', help='Fill vacancies across this many worker processes', type=int, default=1)
 		
 		return parser
 	
+	# Return a Profiler if --profile-report was given, or a NullProfiler
+	@staticmethod
+	def makeProfiler(args):
+		if args.profile_report:
+			return profiler.Profiler(memory=args.profile_memory)
+		return profiler.NullProfiler()
+	
+	@staticmethod
+	def writeProfile(args, prof):
+		if args.profile_report:
+			prof.write(args.profile_report)
+			prof.stop()
+	
+	@classmethod
+	def setNums(cls, args):
+		if args.nums == 'float':
+			utils._numclass = float
+		elif args.nums == 'decimal':
+			import decimal
+			utils._numclass = decimal.Decimal
+		elif args.nums == 'fixed':
+			from .utils import fixed
+			fixed.Fixed.configure(args.decimals, args.rounding)
+			utils._numclass = fixed.Fixed
+		else:
+			from fractions import Fraction
+			utils._numclass = Fraction
+	
+	@classmethod
+	def readElection(cls, args):
+		from .utils import blt, bltc
+		
+		aggregate = utils.exact() if args.aggregate is None else args.aggregate
+		
+		# Read gamma-encoded ballots, blt, or compiled blt
+		if args.gamma:
+			from .utils import gammaballots
+			with open(args.gamma[0], 'r') as candidatesFile:
+				candidates = gammaballots.readCandidates(candidatesFile)
+			ballots = gammaballots.readGammaFile(args.election, candidates, binary=args.gamma_format == 'binary', aggregate=aggregate)
+			seats = int(args.gamma[1])
+		elif bltc.isBLTC(args.election):
+			ballots, candidates, seats = bltc.readBLTC(args.election)
+		else:
+			with open(args.election, 'r') as electionFile:
+				ballots, candidates, seats = blt.readBLTFile(electionFile, aggregate=aggregate)
+		
+		if not args.quiet and len(ballots) < ballots.numLoaded:
+			print('---- Aggregated {} ballots into {} ({:.2f}x compression)'.format(ballots.numLoaded, len(ballots), ballots.numLoaded / len(ballots)))
+			print()
+		
+		return ballots, candidates, seats
+	
+	# Fill the vacancies given by --vacancies by countback, printing the candidate elected to each
+	@classmethod
+	def fillVacancies(cls, args, counter, elected, prof):
+		from . import api, countback
+		
+		quotas = countback.QuotaStore.fromCounter(counter, elected)
+		names = quotas.elected if args.vacancies == ['all'] else args.vacancies
+		options = api.CountOptions(method='irv', nums=args.nums, decimals=args.decimals, rounding=args.rounding, ties=[x for x in args.ties if x != 'manual'], randfile=args.randfile, randbyte=int(args.randbyte))
+		
+		with prof.phase('countback'):
+			results = countback.fillVacancies(quotas, names, options, args.countback_withdrawn, args.countback_processes)
+		
+		for name in names:
+			print()
+			print("== COUNTBACK FOR {}".format(name))
+			print()
+			print("     Votes: {}".format(counter.toNum(quotas.parcels[name].votes)))
+			print("     Elected: {}".format(', '.join(results[name].winners)))
+			print("---- Exhausted: {}".format(counter.toNum(results[name].exhausted)))
+	
 	@classmethod
 	def main(cls):
 		print('=== pyRCV {} ==='.format(version.VERSION))
@@ -411,20 +868,28 @@ class STVCounter:
 		parser = cls.getParser()
 		args = parser.parse_args()
 		
-		if args.nums == 'float':
-			utils._numclass = float
-		elif args.nums == 'decimal':
-			import decimal
-			utils._numclass = decimal.Decimal
+		cls.setNums(args)
+		if args.denominator_report and args.nums != 'fraction':
+			parser.error('--denominator-report requires --nums fraction')
 		
-		from .utils import blt
+		prof = cls.makeProfiler(args)
+		with prof.phase('parse'):
+			ballots, candidates, args.seats = cls.readElection(args)
+			prof.count(ballots=ballots.numLoaded)
 		
-		# Read blt
-		with open(args.election, 'r') as electionFile:
-			electionLines = electionFile.read().splitlines()
-			ballots, candidates, args.seats = blt.readBLT(electionLines)
+		if args.vacancies and not [x for x in args.ties if x != 'manual']:
+			parser.error('--vacancies requires ties to be broken by --ties backward, random or all')
 		
 		counter = cls(ballots, candidates, **vars(args))
+		counter.profiler = prof
+		if args.countback or args.vacancies:
+			counter.trackBallots = True
+		
+		if args.processes > 1:
+			from .utils import parallel
+			obstacle = parallel.shardingObstacle(counter.trackBallots, args.shard_subtotals)
+			if obstacle is not None:
+				print('Warning: counting serially, as --processes cannot speed up this count: {}'.format(obstacle), file=sys.stderr)
 		
 		if args.verbose:
 			for ballot in ballots:
@@ -432,39 +897,49 @@ class STVCounter:
 			print()
 		
 		elected, comments, exhausted = counter.countVotes()
-		print()
-		print("== TALLY COMPLETE")
-		print()
-		print("The winners are, in order of election:")
-		
-		print()
-		for i, candidate in enumerate(elected):
-			print("     {}{}".format(candidate.name, ' ({})'.format(comments[i]) if comments and comments[i] else ''))
-		print()
-		
-		print("---- Exhausted: {}".format(counter.toNum(exhausted)))
-		
-		if args.countback:
-			candidate = next(x for x in candidates if x.name == args.countback[0])
-			print("== STORING COUNTBACK DATA FOR {}".format(candidate.name))
+		counter.close()
+		prof.afterCount()
+		with prof.phase('output'):
+			print()
+			print("== TALLY COMPLETE")
+			print()
+			print("The winners are, in order of election:")
 			
-			# Sanity check
-			ctvv = 0
-			for ballot in candidate.ballots:
-				ctvv += ballot.value
-			assert ctvv == candidate.ctvv
+			print()
+			for i, candidate in enumerate(elected):
+				print("     {}{}".format(candidate.name, ' ({})'.format(comments[i]) if comments and comments[i] else ''))
+			print()
 			
-			candidatesToExclude = []
-			for peCandidate in elected:
-				candidatesToExclude.append(peCandidate)
+			print("---- Exhausted: {}".format(counter.toNum(exhausted)))
 			
-			with open(args.countback[1], 'w') as countbackFile:
-				# use --noround to determine whether to use standard BLT format or rational BLT format
-				stringify = str if args.noround else float
+			if args.countback:
+				candidate = next(x for x in candidates if x.name == args.countback[0])
+				print("== STORING COUNTBACK DATA FOR {}".format(candidate.name))
+				
+				ballots = candidate.heldBallots()
 				
+				# Sanity check
+				ctvv = 0
+				for ballot in ballots:
+					ctvv += ballot.value
+				assert ctvv == candidate.ctvv
 				
+				candidatesToExclude = []
+				for peCandidate in elected:
+					candidatesToExclude.append(peCandidate)
 				
-				print('\n'.join(utils.blt.writeBLT([common.Ballot(preferences=x.ballot.preferences, value=x.value, prettyPreferences=x.ballot.prettyPreferences) for x in candidate.ballots], candidates, 1, '', candidatesToExclude, stringify)), file=countbackFile)
+				with open(args.countback[1], 'w') as countbackFile:
+					# use --noround to determine whether to use standard BLT format or rational BLT format
+					stringify = str if args.noround else float
+					
+					
+					
+					print('\n'.join(utils.blt.writeBLT([common.Ballot(preferences=x.ballot.preferences, value=x.value, prettyPreferences=x.ballot.prettyPreferences) for x in ballots], candidates, 1, '', candidatesToExclude, stringify)), file=countbackFile)
+		
+		if args.vacancies:
+			cls.fillVacancies(args, counter, elected, prof)
+		
+		counter.writeProfile(args, prof)
 		
 		print()
 		print("=== Tally computed by pyRCV {} ===".format(version.VERSION))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Count one election under every combination of a grid of counting rules, and compare the winners
+#
+#    election = api.load('election.blt')
+#    scenarios = sweep.grid(methods=['stv', 'wright'], quotas=['geq-droop', 'gt-hb'])
+#    results = sweep.sweep(election, scenarios, processes=4)
+#
+# The election is read and compiled once, and sent once to each worker process rather than with every scenario.
+
+from . import api
+from . import version
+
+import dataclasses
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+# Return CountOptions for every distinct combination of the given rules, on top of base
+# A quota or quotaProg of None is the default for the method
+def grid(methods=('stv',), quotas=(None,), quotaProgs=(None,), ties=(('backward',),), base=None):
+	if base is None:
+		base = api.CountOptions()
+	scenarios = []
+	for method, quota, quotaProg, tieOrder in itertools.product(methods, quotas, quotaProgs, ties):
+		defaultQuota, defaultQuotaProg = api.METHOD_QUOTAS[method]
+		options = dataclasses.replace(base, method=method, quota=quota or defaultQuota, quotaProg=defaultQuotaProg if quotaProg is None else quotaProg, ties=list(tieOrder))
+		if options not in scenarios:
+			scenarios.append(options)
+	return scenarios
+
+# Votes of the weakest winner less those of the strongest candidate not elected, in the last round in which both were in the count
+# Returns None if no candidate was ever in the count against the winners
+def margin(result):
+	for countRound in reversed(result.rounds):
+		winners = [votes for name, votes in countRound.tally.items() if name in result.winners]
+		others = [votes for name, votes in countRound.tally.items() if name not in result.winners]
+		if winners and others:
+			return min(winners) - max(others)
+	return None
+
+# Election counted by this worker process, set once by _initWorker
+_election = None
+
+def _initWorker(election):
+	global _election
+	_election = election
+
+def _countScenario(job):
+	index, options = job
+	record = {'scenario': index, 'options': dataclasses.asdict(options)}
+	start = time.perf_counter()
+	try:
+		result = api.count(_election, options)
+		record['status'] = 'ok'
+		record['result'] = result
+		record['margin'] = margin(result)
+	except Exception as ex:
+		record['status'] = 'error'
+		record['error'] = '{}: {}'.format(type(ex).__name__, ex)
+		record['traceback'] = traceback.format_exc()
+	record['time'] = time.perf_counter() - start
+	return record
+
+# Count the election under each scenario, returning a record for each in the order given
+def sweep(election, scenarios, processes=1):
+	jobs = list(enumerate(scenarios))
+	if processes == 1:
+		_initWorker(election)
+		records = [_countScenario(job) for job in jobs]
+	else:
+		with multiprocessing.Pool(processes, _initWorker, (election,)) as pool:
+			records = pool.map(_countScenario, jobs)
+	return records
+
+def describe(options):
+	return '{} {}{} ties={}'.format(options.method, options.quota, ' prog' if options.quotaProg else '', ','.join(options.ties))
+
+# Print a table of the winners and margin of each scenario, marking winners not elected under every scenario
+def printTable(records, toNum, file=sys.stdout):
+	counted = [record for record in records if record['status'] == 'ok']
+	common = set.intersection(*[set(record['result'].winners) for record in counted]) if counted else set()
+	
+	width = max([len(describe(api.CountOptions(**record['options']))) for record in records] + [8])
+	print('{:<{}} {:>12} {}'.format('scenario', width, 'margin', 'winners'), file=file)
+	for record in records:
+		description = describe(api.CountOptions(**record['options']))
+		if record['status'] != 'ok':
+			print('{:<{}} {:>12} {}'.format(description, width, '', record['error']), file=file)
+			continue
+		winners = ', '.join(name if name in common else '*' + name for name in record['result'].winners)
+		margin = '' if record['margin'] is None else toNum(record['margin'])
+		print('{:<{}} {:>12} {}'.format(description, width, margin, winners), file=file)
+	
+	print(file=file)
+	print('Elected under every scenario: {}'.format(', '.join(sorted(common))), file=file)
+	print('* Not elected under every scenario', file=file)
+
+def main():
+	import argparse
+	
+	parser = argparse.ArgumentParser(description='Count one election under a grid of counting rules, and compare the winners.')
+	parser.add_argument('--election', required=True, help='OpenSTV blt file, or compiled blt file')
+	parser.add_argument('--methods', help='Counting methods to compare', choices=list(api.METHODS), nargs='+', default=['stv'])
+	parser.add_argument('--quotas', help="Quotas to compare, or 'default' for that of the method", choices=['default', 'geq-droop', 'gt-hb', 'geq-hb'], nargs='+', default=['default'])
+	parser.add_argument('--quota-prog', help="Whether to use a progressively-reducing quota, or 'default' for that of the method", choices=['default', 'yes', 'no'], nargs='+', default=['default'])
+	parser.add_argument('--ties', help='Tie-breaking orders to compare, each a comma-separated list, e.g. backward,all', nargs='+', default=['backward'])
+	parser.add_argument('--nums', help='Kind of arithmetic to use', choices=['float', 'fraction', 'decimal', 'fixed'], default='fraction')
+	parser.add_argument('--fast', help="Don't perform a full tally", action='store_true')
+	parser.add_argument('--processes', help='Number of worker processes', type=int, default=os.cpu_count())
+	parser.add_argument('--output', help='Also write the results as JSON lines to the given file')
+	args = parser.parse_args()
+	
+	ties = [tuple(x.split(',')) for x in args.ties]
+	for tieOrder in ties:
+		if 'manual' in tieOrder:
+			parser.error('Ties cannot be broken manually in a sweep')
+	
+	scenarios = grid(
+		methods=args.methods,
+		quotas=[None if x == 'default' else x for x in args.quotas],
+		quotaProgs=[{'default': None, 'yes': True, 'no': False}[x] for x in args.quota_prog],
+		ties=ties,
+		base=api.CountOptions(nums=args.nums, fast=args.fast),
+	)
+	
+	print('=== pyRCV {}: {} scenarios ==='.format(version.VERSION, len(scenarios)))
+	print()
+	
+	records = sweep(api.load(args.election, aggregate=args.nums == 'fraction'), scenarios, args.processes)
+	printTable(records, lambda x: '{:.2f}'.format(float(x)))
+	
+	if args.output:
+		with open(args.output, 'w') as f:
+			for record in records:
+				if record['status'] == 'ok':
+					record = dict(record, result=record['result'].toJSON(), margin=None if record['margin'] is None else str(record['margin']))
+				print(json.dumps(record), file=f)
+	
+	if any(record['status'] != 'ok' for record in records):
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
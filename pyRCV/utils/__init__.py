@@ -3,3 +3,8 @@ _numclass = Fraction
 
 def num(x):
 	return _numclass(x)
+
+# Whether the current kind of arithmetic is exact, so that merging identical ballots cannot change the result
+# With float, Decimal or fixed-point arithmetic, merging changes the order and rounding of additions
+def exact():
+	return _numclass is Fraction
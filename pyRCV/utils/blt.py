@@ -13,11 +13,13 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .common import Ballot, Candidate
+from . import num
+from .common import Ballot, BallotSet, Candidate, aggregateBallots
 
+import array
 import sys
 
-def readBLT(electionLines):
+def readBLT(electionLines, aggregate=False):
 	ballotData = [] # Can't process until we know the candidates
 	candidates = []
 	
@@ -52,6 +54,10 @@ def readBLT(electionLines):
 		preferences = [candidates[x] for x in ballot[1] if x not in withdrawn]
 		ballots.append(Ballot(preferences, [x.name for x in preferences], ballot[0]))
 	
+	# Merge identical ballots, now that withdrawn candidates have been removed
+	if aggregate:
+		ballots = aggregateBallots(ballots)
+	
 	# Process withdrawn candidates
 	withdrawnCandidates = [candidates[x] for x in withdrawn]
 	for candidate in withdrawnCandidates:
@@ -59,6 +65,67 @@ def readBLT(electionLines):
 	
 	return ballots, candidates, seats
 
+# Read a blt file line by line, without holding the whole file in memory, directly into a BallotSet
+def readBLTFile(electionFile, aggregate=False):
+	electionLines = (line.rstrip('\n') for line in electionFile)
+	
+	# Read first line
+	bits = next(electionLines).split(' ')
+	numCandidates = int(bits[0])
+	seats = int(bits[1])
+	
+	# Read withdrawn candidates
+	withdrawn = []
+	line = next(electionLines)
+	if line.startswith("-"):
+		withdrawn = [int(x.lstrip("-")) - 1 for x in line.split(" ")]
+		line = next(electionLines)
+	
+	# Map 1-indexed blt candidate numbers to indices after withdrawn candidates are removed
+	indices = [None]
+	for x in range(numCandidates):
+		indices.append(None if x in withdrawn else x - sum(1 for y in withdrawn if y < x))
+	
+	# Read ballots
+	values = []
+	offsets = array.array('l', [0])
+	preferences = array.array('l')
+	aggregated = {}
+	numLoaded = 0
+	while line != '0': # End of ballots
+		bits = line.split(' ')
+		ballotPreferences = [indices[int(x)] for x in bits[1:] if x != '0']
+		ballotPreferences = [x for x in ballotPreferences if x is not None]
+		numLoaded += 1
+		
+		if aggregate:
+			key = tuple(ballotPreferences)
+			if key in aggregated:
+				values[aggregated[key]] += num(bits[0])
+				line = next(electionLines)
+				continue
+			aggregated[key] = len(values)
+		
+		values.append(num(bits[0]))
+		preferences.extend(ballotPreferences)
+		offsets.append(len(preferences))
+		line = next(electionLines)
+	
+	# Read candidates
+	trailer = list(electionLines)
+	candidates = [Candidate(x.strip('"')) for x in trailer[:-1]] # len - 1 to skip title
+	
+	assert len(candidates) == numCandidates
+	
+	# Process withdrawn candidates
+	candidates = [x for i, x in enumerate(candidates) if i not in withdrawn]
+	
+	ballots = BallotSet(candidates, values, offsets, preferences)
+	ballots.numLoaded = numLoaded
+	ballots.name = trailer[-1].strip('"')
+	
+	return ballots, candidates, seats
+
 def writeBLT(ballots, candidates, seats, name='', withdrawn=[], stringify=str):
 	electionLines = []
 	
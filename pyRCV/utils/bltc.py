@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compiled blt files: a binary form of a BallotSet which can be memory-mapped without parsing
+#
+# Layout, in native byte order:
+#   header (see HEADER)
+#   election name and candidate names, each a uint32 length followed by UTF-8
+#   padding to a multiple of 8 bytes
+#   weights: int64 per ballot, or if WEIGHTS_TEXT, a uint64 length followed by newline-separated values, each an integer or decimal, or a ratio n/d of two, padded
+#   offsets: int64 per ballot, plus one
+#   preferences: int32 per preference
+
+from . import num
+from .common import BallotSet, Candidate
+
+import array
+import mmap
+import struct
+import sys
+
+MAGIC = b'BLTC'
+VERSION = 1
+HEADER = struct.Struct('=4sIBBxxIIQQQ') # magic, version, little endian?, weights kind, candidates, seats, ballots, preferences, loaded
+
+WEIGHTS_INT = 0
+WEIGHTS_TEXT = 1
+
+def isBLTC(path):
+	with open(path, 'rb') as f:
+		return f.read(len(MAGIC)) == MAGIC
+
+def _pad(data):
+	data.extend(b'\0' * (-len(data) % 8))
+
+# Weights are compiled from exact values, so may be ratios such as 3/2, which only Fraction can parse
+def _weight(text):
+	numerator, _, denominator = text.partition('/')
+	if denominator:
+		return num(numerator) / num(denominator)
+	return num(numerator)
+
+def writeBLTC(ballots, seats, outFile):
+	# Use exact integers for weights where possible, otherwise fall back to their text form
+	weightsKind = WEIGHTS_INT
+	weights = array.array('q')
+	for value in ballots.values:
+		if value != int(value) or not -2**63 <= int(value) < 2**63:
+			weightsKind = WEIGHTS_TEXT
+			break
+		weights.append(int(value))
+	
+	data = bytearray(HEADER.pack(MAGIC, VERSION, sys.byteorder == 'little', weightsKind, len(ballots.candidates), seats, len(ballots), len(ballots.preferences), ballots.numLoaded))
+	
+	for name in [ballots.name] + [candidate.name for candidate in ballots.candidates]:
+		encoded = name.encode('utf-8')
+		data.extend(struct.pack('=I', len(encoded)))
+		data.extend(encoded)
+	_pad(data)
+	
+	if weightsKind == WEIGHTS_INT:
+		data.extend(weights.tobytes())
+	else:
+		encoded = '\n'.join(str(value) for value in ballots.values).encode('utf-8')
+		data.extend(struct.pack('=Q', len(encoded)))
+		data.extend(encoded)
+		_pad(data)
+	
+	data.extend(array.array('q', ballots.offsets).tobytes())
+	data.extend(array.array('i', ballots.preferences).tobytes())
+	
+	outFile.write(data)
+
+# The offsets and preferences of the returned BallotSet are views of the mapped file
+def readBLTC(path):
+	with open(path, 'rb') as f:
+		mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	view = memoryview(mapped)
+	
+	magic, version, littleEndian, weightsKind, numCandidates, seats, numBallots, numPreferences, numLoaded = HEADER.unpack_from(view, 0)
+	if magic != MAGIC or version != VERSION:
+		raise ValueError('{} is not a version {} compiled blt file'.format(path, VERSION))
+	if bool(littleEndian) != (sys.byteorder == 'little'):
+		raise ValueError('{} was compiled on a machine with different byte order'.format(path))
+	position = HEADER.size
+	
+	names = []
+	for i in range(numCandidates + 1):
+		length, = struct.unpack_from('=I', view, position)
+		position += 4
+		names.append(bytes(view[position:position + length]).decode('utf-8'))
+		position += length
+	position += -position % 8
+	
+	if weightsKind == WEIGHTS_INT:
+		values = [num(x) for x in view[position:position + 8 * numBallots].cast('q')]
+		position += 8 * numBallots
+	else:
+		length, = struct.unpack_from('=Q', view, position)
+		position += 8
+		values = [_weight(x) for x in bytes(view[position:position + length]).decode('utf-8').split('\n')] if numBallots else []
+		position += length
+		position += -position % 8
+	
+	offsets = view[position:position + 8 * (numBallots + 1)].cast('q')
+	position += 8 * (numBallots + 1)
+	preferences = view[position:position + 4 * numPreferences].cast('i')
+	
+	candidates = [Candidate(name) for name in names[1:]]
+	ballots = BallotSet(candidates, values, offsets, preferences)
+	ballots.numLoaded = numLoaded
+	ballots.name = names[0]
+	
+	return ballots, candidates, seats
+
+def main():
+	import argparse
+	from . import blt
+	
+	parser = argparse.ArgumentParser(description='Compile an OpenSTV blt file for fast loading.')
+	parser.add_argument('election', help='OpenSTV blt file')
+	parser.add_argument('output', help='Compiled blt file to write')
+	parser.add_argument('--aggregate', help='Merge identical ballots. Only counts with --nums fraction are certain to be unchanged by merging', action='store_true')
+	args = parser.parse_args()
+	
+	with open(args.election, 'r') as electionFile:
+		ballots, candidates, seats = blt.readBLTFile(electionFile, aggregate=args.aggregate)
+	
+	with open(args.output, 'wb') as outFile:
+		writeBLTC(ballots, seats, outFile)
+
+if __name__ == '__main__':
+	main()
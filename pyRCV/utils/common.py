@@ -15,6 +15,13 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from . import num
+from .. import utils
+
+import array
+import bisect
+import enum
+import fractions
+import math
 
 class Ballot:
 	def __init__(self, preferences, prettyPreferences, value=1):
@@ -23,19 +30,289 @@ class Ballot:
 		
 		self.value = num(value)
 
+# Merge ballots with identical preferences into a single ballot carrying their combined value
+def aggregateBallots(ballots):
+	aggregated = {}
+	for ballot in ballots:
+		key = tuple(id(preference) for preference in ballot.preferences)
+		if key in aggregated:
+			aggregated[key].value += ballot.value
+		else:
+			aggregated[key] = Ballot(ballot.preferences, ballot.prettyPreferences, ballot.value)
+	return list(aggregated.values())
+
+# Return the sum of the values
+# Fractions are summed as integer numerators over a common denominator, reducing only once, as ballot weights mostly share a denominator (usually 1)
+def sumValues(values):
+	if utils._numclass is not fractions.Fraction:
+		total = num('0')
+		for value in values:
+			total += value
+		return total
+	
+	numerator = 0
+	denominator = 1
+	for value in values:
+		if value.denominator == denominator:
+			numerator += value.numerator
+		else:
+			common = math.lcm(denominator, value.denominator)
+			numerator = numerator * (common // denominator) + value.numerator * (common // value.denominator)
+			denominator = common
+	return fractions.Fraction(numerator, denominator)
+
 class Candidate:
 	def __init__(self, name):
 		self.name = name
+		self.index = None
 		self.ctvv = num('0')
 		self.keep_value = num('1')
 		self.ballots = []
+		self.parcels = []
+	
+	# All ballots held by the candidate, including those in parcels, at their current values
+	def heldBallots(self):
+		ballots = list(self.ballots)
+		for parcel in self.parcels:
+			for ballot in parcel.ballots:
+				ballots.append(CandidateBallot(ballot.ballot, ballot.value * parcel.value, ballot.position))
+		return ballots
 	
 	def __repr__(self):
 		return '<{}: {}>'.format(self.__class__.__name__, self.name)
 
+# A ballot, or part of one, held by a candidate
+# position is the index in ballot.preferences of the candidate currently holding it, from which transfers resume
 class CandidateBallot:
-	def __init__(self, ballot, value=None):
+	def __init__(self, ballot, value=None, position=None):
 		if value is None:
 			value = ballot.value
 		self.ballot = ballot
 		self.value = num(value)
+		self.position = position
+
+
+class CandidateStatus(enum.IntEnum):
+	HOPEFUL = 0
+	ELECTED = 1
+	EXCLUDED = 2 # Also candidates not standing in the count at all
+
+# Ballots transferred together at a common transfer value, as in a hand count
+# Each ballot's value is its weight within the parcel, so it is worth ballot.value * parcel.value
+class Parcel:
+	def __init__(self, ballots, value):
+		self.ballots = ballots
+		self.value = value
+		
+		self.weight = sumValues(ballot.value for ballot in ballots)
+	
+	@property
+	def votes(self):
+		return self.weight * self.value
+
+# Status of every candidate in a BallotSet, by candidate index
+class CandidateStates:
+	def __init__(self, candidates):
+		self.candidates = candidates
+		self.status = bytearray([CandidateStatus.EXCLUDED]) * len(candidates)
+	
+	# Make remaining candidates hopeful, or elected if they are in electedCandidates, and all others excluded
+	def reset(self, remainingCandidates, electedCandidates):
+		status = self.status
+		status[:] = bytearray([CandidateStatus.EXCLUDED]) * len(status)
+		for candidate in remainingCandidates:
+			status[candidate.index] = CandidateStatus.HOPEFUL
+		for candidate in electedCandidates:
+			status[candidate.index] = CandidateStatus.ELECTED
+	
+	def elect(self, candidate):
+		self.status[candidate.index] = CandidateStatus.ELECTED
+	
+	def exclude(self, candidate):
+		self.status[candidate.index] = CandidateStatus.EXCLUDED
+	
+	def statusOf(self, candidate):
+		return CandidateStatus(self.status[candidate.index])
+	
+	def isHopeful(self, candidate):
+		return self.status[candidate.index] == CandidateStatus.HOPEFUL
+	
+	def isElected(self, candidate):
+		return self.status[candidate.index] == CandidateStatus.ELECTED
+
+# Votes of each candidate remaining in each round of a count, by candidate index, for breaking ties backwards
+# Only changes are stored: for each candidate, the rounds in which their votes changed, and their votes from that round (None once they are no longer in the count)
+class TallyHistory:
+	def __init__(self, candidates):
+		self.candidates = candidates
+		self.numRounds = 0
+		self.changeRounds = [[] for candidate in candidates]
+		self.changeVotes = [[] for candidate in candidates]
+		# Indices of candidates in the count in the latest round
+		self.present = set()
+	
+	# Record the votes of a round, given as a dict of candidate -> votes
+	def append(self, tally):
+		round = self.numRounds
+		present = set()
+		for candidate, votes in tally.items():
+			index = candidate.index
+			present.add(index)
+			changeVotes = self.changeVotes[index]
+			if not changeVotes or changeVotes[-1] is None or changeVotes[-1] != votes:
+				self.changeRounds[index].append(round)
+				changeVotes.append(votes)
+		for index in self.present - present:
+			self.changeRounds[index].append(round)
+			self.changeVotes[index].append(None)
+		self.present = present
+		self.numRounds += 1
+	
+	# Votes of the candidate in the given round (0-based), or None if they were not in the count
+	def votes(self, round, candidate):
+		position = bisect.bisect_right(self.changeRounds[candidate.index], round) - 1
+		if position < 0:
+			return None
+		return self.changeVotes[candidate.index][position]
+	
+	def __len__(self):
+		return self.numRounds
+	
+	# Return the tied candidate who, in the most recent round in which it was so, alone had the fewest votes of the tied candidates, and no other candidate had as few
+	# Returns None if there was no such round
+	def lowestBackward(self, tiedCandidates):
+		changeRounds = self.changeRounds
+		changeVotes = self.changeVotes
+		# Position in each candidate's changes of their votes in the round being looked at, moved back as the rounds are walked backwards
+		positions = [len(x) - 1 for x in changeRounds]
+		
+		def votesAt(index, round):
+			position = positions[index]
+			while position >= 0 and changeRounds[index][position] > round:
+				position -= 1
+			positions[index] = position
+			return None if position < 0 else changeVotes[index][position]
+		
+		indices = [candidate.index for candidate in tiedCandidates]
+		for round in reversed(range(self.numRounds)):
+			row = [(index, votesAt(index, round)) for index in indices]
+			values = [votes for index, votes in row if votes is not None]
+			if not values:
+				continue
+			lowest = min(values)
+			if values.count(lowest) > 1:
+				# Still tied in this round
+				continue
+			allVotes = [votesAt(index, round) for index in range(len(changeRounds))]
+			if sum(1 for votes in allVotes if votes is not None and votes == lowest) > 1:
+				# Tied with a candidate outside the tie
+				continue
+			return next(self.candidates[index] for index, votes in row if votes is not None and votes == lowest)
+		return None
+
+# Compiled form of a list of ballots
+# Candidates are referred to by their index in self.candidates, and the preferences of ballot i are preferences[offsets[i]:offsets[i + 1]]
+class BallotSet:
+	def __init__(self, candidates, values=None, offsets=None, preferences=None):
+		self.candidates = list(candidates)
+		for index, candidate in enumerate(self.candidates):
+			candidate.index = index
+		
+		self.values = [] if values is None else values
+		self.offsets = array.array('l', [0]) if offsets is None else offsets
+		self.preferences = array.array('l') if preferences is None else preferences
+		
+		# Number of ballots read from the source, before any were merged
+		self.numLoaded = len(self.values)
+		self.name = ''
+		
+		self._ballots = [None] * len(self.values)
+	
+	@classmethod
+	def fromBallots(cls, ballots, candidates):
+		ballotSet = cls(candidates)
+		for ballot in ballots:
+			for preference in ballot.preferences:
+				if preference.index is None or preference.index >= len(ballotSet.candidates) or ballotSet.candidates[preference.index] is not preference:
+					# Not in the candidate list (e.g. withdrawn), so it can never receive votes
+					preference.index = len(ballotSet.candidates)
+					ballotSet.candidates.append(preference)
+			ballotSet.append([preference.index for preference in ballot.preferences], ballot.value, ballot)
+		return ballotSet
+	
+	def append(self, preferences, value, ballot=None):
+		self.values.append(num(value))
+		self.preferences.extend(preferences)
+		self.offsets.append(len(self.preferences))
+		self._ballots.append(ballot)
+		self.numLoaded += 1
+	
+	def preferencesOf(self, i):
+		return self.preferences[self.offsets[i]:self.offsets[i + 1]]
+	
+	# Return the Ballot object for ballot i, building it if necessary
+	def ballot(self, i):
+		ballot = self._ballots[i]
+		if ballot is None:
+			preferences = [self.candidates[x] for x in self.preferencesOf(i)]
+			ballot = Ballot(preferences, [x.name for x in preferences], self.values[i])
+			self._ballots[i] = ballot
+		return ballot
+	
+	def __len__(self):
+		return len(self.values)
+	
+	def __iter__(self):
+		for i in range(len(self.values)):
+			yield self.ballot(i)
+
+class BallotTrieNode:
+	__slots__ = ('candidate', 'children', 'votes', 'ending', 'lo', 'hi')
+	
+	def __init__(self, candidate, lo):
+		self.candidate = candidate
+		self.children = []
+		self.votes = num('0') # Value of all ballots passing through this node
+		self.ending = num('0') # Value of ballots whose last preference is this node
+		self.lo = lo
+		self.hi = lo
+
+# Prefix tree of a BallotSet, so that ballots sharing leading preferences are evaluated together
+# The ballots under a node are order[node.lo:node.hi]
+class BallotTrie:
+	def __init__(self, ballotSet):
+		self.ballotSet = ballotSet
+		self.order = sorted(range(len(ballotSet)), key=lambda i: tuple(ballotSet.preferencesOf(i)))
+		self.root = BallotTrieNode(None, 0)
+		
+		path = [self.root]
+		previous = ()
+		for position, i in enumerate(self.order):
+			preferences = tuple(ballotSet.preferencesOf(i))
+			
+			depth = 0
+			while depth < len(preferences) and depth < len(previous) and preferences[depth] == previous[depth]:
+				depth += 1
+			
+			for node in path[depth + 1:]:
+				node.hi = position
+			del path[depth + 1:]
+			
+			for candidate in preferences[depth:]:
+				node = BallotTrieNode(candidate, position)
+				path[-1].children.append(node)
+				path.append(node)
+			
+			value = ballotSet.values[i]
+			for node in path:
+				node.votes += value
+			path[-1].ending += value
+			
+			previous = preferences
+		
+		for node in path:
+			node.hi = len(self.order)
+	
+	# Return the human-readable preferences leading to a node at the given depth, for logging
+	def prettyPrefix(self, node, depth):
+		return [self.ballotSet.candidates[x].name for x in self.ballotSet.preferencesOf(self.order[node.lo])[:depth]]
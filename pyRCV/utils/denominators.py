@@ -0,0 +1,97 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Size of the denominators of exact (--nums fraction) values in each round of a count, to show how they grow
+#
+#    counter.events.attach(denominators.DenominatorSink(counter, 'denominators.json'))
+#
+# The report gives, for each round, the largest and mean size in bits of the denominators of the candidates' votes, of the values at which their ballots and parcels are held, and of the transfer values of any surpluses distributed.
+# Print a report as a table with: python -m pyRCV.utils.denominators denominators.json
+
+from . import events
+
+import json
+
+def bits(value):
+	return value.denominator.bit_length()
+
+def summarise(values):
+	sizes = [bits(value) for value in values]
+	if not sizes:
+		return {'count': 0, 'max': 0, 'mean': 0}
+	return {'count': len(sizes), 'max': max(sizes), 'mean': sum(sizes) / len(sizes)}
+
+# Event sink recording the denominators of the counter's values at the end of each round, and writing them as JSON when closed
+class DenominatorSink:
+	detailed = False
+	
+	def __init__(self, counter, path):
+		self.counter = counter
+		self.path = path
+		self.rounds = []
+		self.count = None
+		self.transfers = []
+	
+	def write(self, event):
+		if isinstance(event, events.Round):
+			self.count = event.count
+			self.transfers = []
+		elif isinstance(event, events.SurplusTransfer):
+			self.transfers.append(event.value)
+		elif isinstance(event, events.Tally):
+			self.record(event.tally)
+	
+	def record(self, tally):
+		ballots = []
+		parcels = []
+		for candidate in tally:
+			ballots.extend(ballot.value for ballot in candidate.ballots)
+			parcels.extend(parcel.value for parcel in candidate.parcels)
+		
+		self.rounds.append({
+			'round': self.count,
+			'votes': summarise(tally.values()),
+			'ballots': summarise(ballots),
+			'parcels': summarise(parcels),
+			'transfers': summarise(self.transfers),
+		})
+	
+	def close(self):
+		with open(self.path, 'w') as f:
+			json.dump({'rounds': self.rounds}, f, indent=1)
+
+def printReport(report):
+	print('{:>6} {:>10} {:>10} {:>11} {:>10} {:>11} {:>10} {:>10}'.format('round', 'votes max', 'mean', 'ballots max', 'mean', 'parcels max', 'mean', 'transfers'))
+	for entry in report['rounds']:
+		print('{:>6} {:>10} {:>10.1f} {:>11} {:>10.1f} {:>11} {:>10.1f} {:>10}'.format(
+			entry['round'],
+			entry['votes']['max'], entry['votes']['mean'],
+			entry['ballots']['max'], entry['ballots']['mean'],
+			entry['parcels']['max'], entry['parcels']['mean'],
+			entry['transfers']['max'],
+		))
+
+def main():
+	import argparse
+	
+	parser = argparse.ArgumentParser(description='Print a report of denominator sizes written by --denominator-report')
+	parser.add_argument('report', help='JSON file written by --denominator-report')
+	args = parser.parse_args()
+	
+	with open(args.report, 'r') as f:
+		printReport(json.load(f))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,241 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Structured records of the steps of a count, delivered to any number of sinks
+# Events hold raw values; nothing is formatted unless a sink asks for it
+
+from . import common
+
+import json
+import sys
+
+class Event:
+	kind = None
+	# Whether the event is only shown in the text log with --verbose
+	detailed = False
+	# Whether the event is shown in the text log even with --quiet
+	essential = False
+	# Events with no template are not shown in the text log
+	template = None
+	fields = ()
+	
+	def __init__(self, *args):
+		for field in self.fields:
+			setattr(self, field, None)
+		for field, value in zip(self.fields, args):
+			setattr(self, field, value)
+	
+	# Render the event as a line of the text log, formatting numbers with toNum
+	# Lists, such as the preferences of a ballot, are shown as is
+	def render(self, toNum):
+		values = {}
+		for field in self.fields:
+			value = getattr(self, field)
+			if isinstance(value, common.Candidate):
+				value = value.name
+			elif value is not None and not isinstance(value, (str, int, list)):
+				value = toNum(value)
+			values[field] = value
+		return self.template.format(**values)
+	
+	# Return the event as a JSON-serialisable dict, with numbers as exact strings
+	def toJSON(self):
+		record = {'event': self.kind}
+		for field in self.fields:
+			value = getattr(self, field)
+			if value is None:
+				continue
+			if isinstance(value, common.Candidate):
+				value = value.name
+			elif isinstance(value, list):
+				value = [str(x) for x in value]
+			elif isinstance(value, dict):
+				value = {(k.name if isinstance(k, common.Candidate) else str(k)): str(v) for k, v in value.items()}
+			elif not isinstance(value, (str, int)):
+				value = str(value)
+			record[field] = value
+		return record
+
+# A line of text, such as the resolution of a tie
+class Message(Event):
+	kind = 'message'
+	essential = True
+	template = '{text}'
+	fields = ('text',)
+
+class Round(Event):
+	kind = 'round'
+	template = '\n== COUNT {count}'
+	fields = ('count',)
+
+class Quota(Event):
+	kind = 'quota'
+	template = '---- Quota: {quota}'
+	fields = ('quota',)
+
+# A recalculation of the quota within a count, not shown in the text log
+class QuotaUpdate(Quota):
+	template = None
+
+# The tally of votes at the end of a count
+class Tally(Event):
+	kind = 'tally'
+	fields = ('tally', 'exhausted')
+
+class SurplusTransfer(Event):
+	kind = 'surplus'
+	template = '---- Transferring surplus from {candidate} at value {value}'
+	fields = ('candidate', 'value')
+
+class Assignment(Event):
+	kind = 'assignment'
+	detailed = True
+	template = '   - Assigning {votes} of {ballotValue} votes to {candidate} at value {keepValue} via {via}'
+	fields = ('candidate', 'votes', 'ballotValue', 'keepValue', 'via')
+
+class Exhaustion(Event):
+	kind = 'exhaustion'
+	detailed = True
+	template = '   - Exhausted {votes} votes via {via}'
+	fields = ('votes', 'via', 'fromCandidate')
+
+class Transfer(Event):
+	kind = 'transfer'
+	detailed = True
+	template = '   - Transferring {votes} votes to {toCandidate} via {via}'
+	fields = ('toCandidate', 'votes', 'via', 'fromCandidate')
+
+class Reassignment(Transfer):
+	kind = 'reassignment'
+	template = '   - Reassigning {votes} votes to {toCandidate} via {via}'
+
+class ParcelTransfer(Event):
+	kind = 'parcel-transfer'
+	detailed = True
+	template = '   - Transferring parcel of {ballots} ballots at value {value} to {toCandidate}'
+	fields = ('toCandidate', 'ballots', 'value', 'fromCandidate')
+
+class ParcelExhaustion(Event):
+	kind = 'parcel-exhaustion'
+	detailed = True
+	template = '   - Exhausted parcel of {ballots} ballots at value {value}'
+	fields = ('ballots', 'value', 'fromCandidate')
+
+class KeepValue(Event):
+	kind = 'keep-value'
+	detailed = True
+	template = '     Reducing {candidate} keep value from {old} to {new}'
+	fields = ('candidate', 'old', 'new')
+
+class Election(Event):
+	kind = 'election'
+	template = '**** {candidate} provisionally elected'
+	fields = ('candidate', 'votes')
+
+class ElectionOnVotes(Election):
+	template = '**** {candidate} provisionally elected on {votes} votes'
+
+class ElectionOnQuotas(Election):
+	template = '**** {candidate} provisionally elected on {quotas} quotas'
+	fields = ('candidate', 'votes', 'quotas')
+
+class Exclusion(Event):
+	kind = 'exclusion'
+	template = '---- Excluding {candidate}'
+	fields = ('candidate',)
+
+class BulkExclusion(Exclusion):
+	template = '---- Bulk excluding {candidate}'
+
+# Writes events as the text log
+class TextSink:
+	def __init__(self, toNum, detailed=False, summary=True, file=None):
+		self.toNum = toNum
+		self.detailed = detailed
+		self.summary = summary
+		self.file = file
+	
+	def write(self, event):
+		if event.template is None:
+			return
+		if event.detailed:
+			show = self.detailed
+		else:
+			show = event.essential or self.summary
+		if show:
+			print(event.render(self.toNum), file=self.file or sys.stdout)
+	
+	def close(self):
+		pass
+
+# Writes events as JSON lines, in batches of bufferSize
+class JSONLSink:
+	detailed = True
+	
+	def __init__(self, file, bufferSize=4096):
+		self.file = file
+		self.bufferSize = bufferSize
+		self.buffer = []
+	
+	def write(self, event):
+		self.buffer.append(json.dumps(event.toJSON()))
+		if len(self.buffer) >= self.bufferSize:
+			self.flush()
+	
+	def flush(self):
+		if self.buffer:
+			self.file.write('\n'.join(self.buffer) + '\n')
+			self.buffer = []
+		self.file.flush()
+	
+	def close(self):
+		self.flush()
+		self.file.close()
+
+# Accepts and discards every event, without asking for per-ballot events to be built
+class NullSink:
+	detailed = False
+	
+	def write(self, event):
+		pass
+	
+	def close(self):
+		pass
+
+# Dispatches events to the attached sinks
+# Callers should construct per-ballot events only if self.detailed, and other events only if the log is truthy
+class EventLog:
+	def __init__(self, sinks=()):
+		self.sinks = []
+		self.detailed = False
+		for sink in sinks:
+			self.attach(sink)
+	
+	def attach(self, sink):
+		self.sinks.append(sink)
+		self.detailed = any(x.detailed for x in self.sinks)
+	
+	def __bool__(self):
+		return bool(self.sinks)
+	
+	def emit(self, event):
+		for sink in self.sinks:
+			sink.write(event)
+	
+	def close(self):
+		for sink in self.sinks:
+			sink.close()
+		self.sinks = []
+		self.detailed = False
@@ -0,0 +1,184 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Fixed-point decimal arithmetic, for counts whose rules specify a number of decimal places
+# Values are stored as Python ints scaled by 10^places. Addition and subtraction are exact; the results of multiplication, division and conversion are truncated or rounded to the number of places.
+
+from fractions import Fraction
+
+import numbers
+
+class Fixed:
+	__slots__ = ('value',)
+	
+	places = 6
+	scale = 10 ** 6
+	rounding = 'truncate'
+	
+	# Sums of Fixed values do not depend on the order of addition
+	exactAddition = True
+	
+	@classmethod
+	def configure(cls, places, rounding='truncate'):
+		if rounding not in ('truncate', 'round'):
+			raise ValueError('Unknown rounding rule {}'.format(rounding))
+		cls.places = places
+		cls.scale = 10 ** places
+		cls.rounding = rounding
+	
+	@classmethod
+	def getConfiguration(cls):
+		return (cls.places, cls.rounding)
+	
+	# Divide the integers n by d, truncating towards zero or rounding half away from zero
+	@classmethod
+	def _divide(cls, n, d):
+		if d < 0:
+			n, d = -n, -d
+		if cls.rounding == 'round':
+			q = (abs(n) * 2 + d) // (d * 2)
+		else:
+			q = abs(n) // d
+		return q if n >= 0 else -q
+	
+	@classmethod
+	def _raw(cls, value):
+		result = object.__new__(cls)
+		result.value = value
+		return result
+	
+	def __init__(self, x=0):
+		if isinstance(x, Fixed):
+			self.value = x.value
+		elif isinstance(x, int):
+			self.value = x * self.scale
+		else:
+			x = Fraction(x)
+			self.value = self._divide(x.numerator * self.scale, x.denominator)
+	
+	# Return other as a scaled int, or None if it is not exactly representable
+	def _coerce(self, other):
+		if isinstance(other, Fixed):
+			return other.value
+		if isinstance(other, int):
+			return other * self.scale
+		return None
+	
+	def __add__(self, other):
+		value = self._coerce(other)
+		if value is None:
+			return NotImplemented
+		return self._raw(self.value + value)
+	
+	__radd__ = __add__
+	
+	def __sub__(self, other):
+		value = self._coerce(other)
+		if value is None:
+			return NotImplemented
+		return self._raw(self.value - value)
+	
+	def __rsub__(self, other):
+		value = self._coerce(other)
+		if value is None:
+			return NotImplemented
+		return self._raw(value - self.value)
+	
+	def __mul__(self, other):
+		if isinstance(other, int):
+			return self._raw(self.value * other)
+		if not isinstance(other, Fixed):
+			return NotImplemented
+		return self._raw(self._divide(self.value * other.value, self.scale))
+	
+	__rmul__ = __mul__
+	
+	def __truediv__(self, other):
+		value = self._coerce(other)
+		if value is None:
+			return NotImplemented
+		return self._raw(self._divide(self.value * self.scale, value))
+	
+	def __rtruediv__(self, other):
+		value = self._coerce(other)
+		if value is None:
+			return NotImplemented
+		return self._raw(self._divide(value * self.scale, self.value))
+	
+	def __neg__(self):
+		return self._raw(-self.value)
+	
+	def __pos__(self):
+		return self
+	
+	def __abs__(self):
+		return self._raw(abs(self.value))
+	
+	def _compare(self, other):
+		value = self._coerce(other)
+		if value is not None:
+			return self.value, value
+		if isinstance(other, numbers.Real):
+			return Fraction(self.value, self.scale), other
+		return None
+	
+	def __eq__(self, other):
+		operands = self._compare(other)
+		return NotImplemented if operands is None else operands[0] == operands[1]
+	
+	def __lt__(self, other):
+		operands = self._compare(other)
+		return NotImplemented if operands is None else operands[0] < operands[1]
+	
+	def __le__(self, other):
+		operands = self._compare(other)
+		return NotImplemented if operands is None else operands[0] <= operands[1]
+	
+	def __gt__(self, other):
+		operands = self._compare(other)
+		return NotImplemented if operands is None else operands[0] > operands[1]
+	
+	def __ge__(self, other):
+		operands = self._compare(other)
+		return NotImplemented if operands is None else operands[0] >= operands[1]
+	
+	def __hash__(self):
+		return hash(Fraction(self.value, self.scale))
+	
+	def __bool__(self):
+		return self.value != 0
+	
+	def __float__(self):
+		return self.value / self.scale
+	
+	def __int__(self):
+		whole = abs(self.value) // self.scale
+		return whole if self.value >= 0 else -whole
+	
+	def __floor__(self):
+		return self.value // self.scale
+	
+	def __ceil__(self):
+		return -(-self.value // self.scale)
+	
+	def __str__(self):
+		sign = '-' if self.value < 0 else ''
+		whole, fraction = divmod(abs(self.value), self.scale)
+		if self.places == 0:
+			return '{}{}'.format(sign, whole)
+		return '{}{}.{:0{}d}'.format(sign, whole, fraction, self.places)
+	
+	def __repr__(self):
+		return "Fixed('{}')".format(self)
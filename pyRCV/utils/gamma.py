@@ -15,6 +15,8 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from bisect import bisect_right
+from collections import OrderedDict
+from math import perm
 
 def to_relative_answers(choices, nr_candidates):
     """
@@ -46,51 +48,107 @@ def to_absolute_answers(choices, nr_candidates):
         tmp_cands.remove(choice)
     return absolute_choices
 
+class GammaCodec(object):
+    """
+    Gamma encoding and decoding of answer choices for a fixed number of
+    candidates, with the offset and factor tables precomputed once.
+
+    Use `get_codec` to share codecs between callers.
+    """
+
+    def __init__(self, nr_candidates, max_choices=None):
+        self.nr_candidates, self.max_choices = \
+            get_choice_params(0, nr_candidates, max_choices)
+        n = self.nr_candidates
+
+        self.offsets = get_offsets(n)
+        # factors[nr_choices][i] == get_factor(n - nr_choices, i), for up to
+        # as many choices as may be encoded
+        self.factors = []
+        for nr_choices in range(min(n, self.max_choices) + 1):
+            b = n - nr_choices
+            factors = [1, 1]
+            for i in range(1, nr_choices):
+                factors.append(factors[-1] * (b + i))
+            self.factors.append(factors)
+
+    def encode(self, choices):
+        nr_choices = len(choices)
+        if nr_choices > self.max_choices:
+            get_choice_params(nr_choices, self.nr_candidates, self.max_choices)
+        if not nr_choices:
+            return 0
+
+        factors = self.factors[nr_choices]
+        sumus = self.offsets[nr_choices - 1]
+        for i in range(1, nr_choices + 1):
+            sumus += choices[-i] * factors[i]
+
+        return sumus + 1
+
+    def decode(self, sumus):
+        sumus -= 1
+        if sumus <= 0:
+            return []
+
+        offsets = self.offsets
+        nr_choices = bisect_right(offsets, sumus)
+        if nr_choices > self.max_choices:
+            get_choice_params(nr_choices, self.nr_candidates, self.max_choices)
+        sumus -= offsets[nr_choices - 1]
+
+        factors = self.factors[nr_choices]
+        choices = []
+        append = choices.append
+        for i in range(nr_choices, 0, -1):
+            choice, sumus = divmod(sumus, factors[i])
+            append(choice)
+
+        return choices
+
+    def encode_many(self, ballots):
+        """
+        Encode each sequence of relative choices in `ballots`.
+        """
+        encode = self.encode
+        return [encode(choices) for choices in ballots]
+
+    def decode_many(self, sums):
+        """
+        Decode each of `sums` to its list of relative choices.
+        """
+        decode = self.decode
+        return [decode(sumus) for sumus in sums]
+
+# Codecs by (nr_candidates, max_choices), least recently used first
+_codecs = OrderedDict()
+CODEC_CACHE_SIZE = 32
+
+def get_codec(nr_candidates, max_choices=None):
+    """
+    Return a shared `GammaCodec`, keeping at most CODEC_CACHE_SIZE of them.
+    """
+    key = (nr_candidates, max_choices)
+    codec = _codecs.get(key)
+    if codec is None:
+        codec = GammaCodec(nr_candidates, max_choices)
+        _codecs[key] = codec
+        if len(_codecs) > CODEC_CACHE_SIZE:
+            _codecs.popitem(last=False)
+    else:
+        _codecs.move_to_end(key)
+    return codec
+
 def gamma_encode(choices, nr_candidates=None, max_choices=None):
     nr_choices = len(choices)
     nr_candidates, max_choices = \
         get_choice_params(nr_choices, nr_candidates, max_choices)
-    if not nr_choices:
-        return 0
-
-    offsets = get_offsets(nr_candidates)
-    sumus = offsets[nr_choices - 1]
-
-    b = nr_candidates - nr_choices
-    i = 1
-    while 1:
-        sumus += choices[-i] * get_factor(b, i)
-        if i >= nr_choices:
-            break
-        i += 1
-
-    sumus += 1
-    return sumus
+    return get_codec(nr_candidates, max_choices).encode(choices)
 
 def gamma_decode(sumus, nr_candidates=None, max_choices=None):
     nr_candidates, max_choices = \
-        get_choice_params(nr_candidates, nr_candidates, max_choices)
-
-    sumus -= 1
-    if sumus <= 0:
-        return []
-
-    offsets = get_offsets(nr_candidates)
-    nr_choices = bisect_right(offsets, sumus)
-    sumus -= offsets[nr_choices - 1]
-
-    choices = []
-    append = choices.append
-    b = nr_candidates - nr_choices
-    i = nr_choices
-    while 1:
-        choice, sumus = divmod(sumus, get_factor(b, i))
-        append(choice)
-        if i <= 1:
-            break
-        i -= 1
-
-    return choices
+        get_choice_params(0, nr_candidates, max_choices)
+    return get_codec(nr_candidates, max_choices).decode(sumus)
 
 def get_choice_params(nr_choices, nr_candidates=None, max_choices=None):
     if nr_candidates is None:
@@ -110,83 +168,21 @@ def get_choice_params(nr_choices, nr_candidates=None, max_choices=None):
 
     return nr_candidates, max_choices
 
-_terms = {}
-
 def get_term(n, k):
     if k >= n:
         return 1
-
-    if n in _terms:
-        t = _terms[n]
-        if k in t:
-            return t[k]
-    else:
-        t = {n:1}
-        _terms[n] = t
-
-    m = k
-    while 1:
-        m += 1
-        if m in t:
-            break
-
-    term = t[m]
-    while 1:
-        term *= m
-        m -= 1
-        t[m] = term
-        if m <= k:
-            break
-
-    return term
-
-_offsets = {}
+    return perm(n, n - k)
 
 def get_offsets(n):
-    if n in _offsets:
-        return _offsets[n]
-
-    factor = 1
     offsets = []
     append = offsets.append
     sumus = 0
-    i = 0
-    while 1:
-        sumus += get_term(n, n-i)
+    for i in range(n + 1):
+        sumus += get_term(n, n - i)
         append(sumus)
-        if i == n:
-            break
-        i += 1
-
-    _offsets[n] = offsets
     return offsets
 
-_factors = {}
-
 def get_factor(b, n):
     if n <= 1:
         return 1
-
-    if b in _factors:
-        t = _factors[b]
-        if n in t:
-            return t[n]
-    else:
-        t = {1: 1}
-        _factors[b] = t
-
-    i = n
-    while 1:
-        i -= 1
-        if i in t:
-            break
-
-    f = t[i]
-    while 1:
-        f *= b + i
-        i += 1
-        t[i] = f
-        if i >= n:
-            break
-
-    return f
+    return perm(b + n - 1, n - 1)
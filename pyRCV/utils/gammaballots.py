@@ -0,0 +1,98 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Read ballots encoded as gamma sums (see gamma.py) directly into a BallotSet, without writing a blt file
+#
+# Each ballot is a single integer encoding its ranking of the candidates. A file of sums is either text, with sums separated by whitespace, or binary, with each sum an unsigned LEB128 varint.
+# Identical ballots have identical sums, so each distinct sum is decoded once, and if aggregating, ballots are merged before they are decoded.
+
+from . import gamma
+from . import num
+from .common import BallotSet, Candidate
+
+import collections
+
+# Yield the sums in a text file
+def readTextSums(f):
+	for line in f:
+		for x in line.split():
+			yield int(x)
+
+# Yield the sums in a binary file of LEB128 varints
+def readBinarySums(f):
+	value = 0
+	shift = 0
+	for byte in f.read():
+		value |= (byte & 0x7f) << shift
+		if byte & 0x80:
+			shift += 7
+		else:
+			yield value
+			value = 0
+			shift = 0
+	if shift:
+		raise ValueError('Gamma-encoded ballots end part way through a sum')
+
+def writeBinarySums(sums, f):
+	out = bytearray()
+	for value in sums:
+		while value > 0x7f:
+			out.append((value & 0x7f) | 0x80)
+			value >>= 7
+		out.append(value)
+	f.write(out)
+
+# Return the gamma sum of a ballot ranking the candidates with the given 0-based indices
+def encodeBallot(preferences, numCandidates):
+	return gamma.get_codec(numCandidates).encode(gamma.to_relative_answers(preferences, numCandidates))
+
+# Read candidate names, one per line, optionally quoted as in a blt file
+def readCandidates(f):
+	return [Candidate(line.strip().strip('"')) for line in f if line.strip()]
+
+# Return a BallotSet of the ballots with the given sums, each of value 1
+# If aggregate is set, identical ballots are merged into one of value equal to their number
+def readGammaBallots(sums, candidates, aggregate=True):
+	codec = gamma.get_codec(len(candidates))
+	limit = codec.offsets[-1]
+	
+	# Sum -> absolute preferences
+	decoded = {}
+	def decode(value):
+		if value not in decoded:
+			if value < 0 or value - 1 >= limit:
+				raise ValueError('{} is not a gamma-encoded ballot for {} candidates'.format(value, len(candidates)))
+			decoded[value] = gamma.to_absolute_answers(codec.decode(value), len(candidates))
+		return decoded[value]
+	
+	ballots = BallotSet(candidates)
+	if aggregate:
+		counts = collections.Counter(sums)
+		for value, count in counts.items():
+			ballots.append(decode(value), num(count))
+		ballots.numLoaded = sum(counts.values())
+	else:
+		for value in sums:
+			ballots.append(decode(value), num(1))
+		ballots.numLoaded = len(ballots)
+	
+	return ballots
+
+def readGammaFile(path, candidates, binary=False, aggregate=True):
+	if binary:
+		with open(path, 'rb') as f:
+			return readGammaBallots(readBinarySums(f), candidates, aggregate)
+	with open(path, 'r') as f:
+		return readGammaBallots(readTextSums(f), candidates, aggregate)
@@ -0,0 +1,126 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Distribution of preferences across a pool of worker processes, each taking a contiguous shard of the ballots
+#
+# Only the distribution of preferences over all the ballots is sharded (the first stage of STV and Wright, and each iteration of Meek); transfers of surpluses and of excluded candidates' ballots remain serial.
+# Sharding is only faster than a serial count if each worker can return just its totals (see shardingObstacle). Counters which keep each candidate's ballots (STV, Wright STV and IRV) would need every assignment sent back and replayed in the parent, so they count serially.
+# With float or Decimal arithmetic, addition is not associative, so shards are only summed separately and their subtotals added if subtotals is set, which may not match a serial count exactly.
+
+from .. import utils
+from . import common
+
+import array
+import multiprocessing
+
+_values = None
+_offsets = None
+_preferences = None
+
+def _initWorker(numclass, numConfiguration, values, offsets, preferences):
+	global _values, _offsets, _preferences
+	utils._numclass = numclass
+	if numConfiguration is not None:
+		numclass.configure(*numConfiguration)
+	_values = values
+	_offsets = offsets
+	_preferences = preferences
+
+# Distribute ballots lo to hi, as in STVCounter.distributePreferences
+# Returns the total for each candidate index, the exhausted total and, if detailed, every assignment and exhaustion in ballot order
+def _distributeShard(lo, hi, keepValues, detailed):
+	zero = utils.num('0')
+	
+	totals = {}
+	exhausted = zero
+	assignments = []
+	exhaustions = []
+	
+	for i in range(lo, hi):
+		ballotValue = _values[i]
+		assigned = zero
+		for position in range(_offsets[i], _offsets[i + 1]):
+			index = _preferences[position]
+			keepValue = keepValues[index]
+			if keepValue > zero:
+				value = (ballotValue - assigned) * keepValue
+				totals[index] = totals.get(index, zero) + value
+				assigned += value
+				if detailed:
+					assignments.append((i, index, value, position - _offsets[i]))
+			
+			if assigned >= ballotValue:
+				break
+		
+		if assigned < ballotValue:
+			exhausted += ballotValue - assigned
+			if detailed:
+				exhaustions.append(ballotValue - assigned)
+	
+	return totals, exhausted, assignments, exhaustions
+
+# Whether per-shard totals may be added in any order without changing the result
+def _exactAddition():
+	return utils.exact() or getattr(utils._numclass, 'exactAddition', False)
+
+# Return why sharding could not be faster than a serial count, or None if it could
+def shardingObstacle(trackBallots, subtotals=False):
+	if trackBallots:
+		return 'each candidate\'s ballots are kept, and would have to be sent back one by one'
+	if not subtotals and not _exactAddition():
+		return 'with float or Decimal arithmetic, every addition would have to be replayed in ballot order (see --shard-subtotals)'
+	return None
+
+class ShardedDistributor:
+	def __init__(self, ballots, processes, subtotals=False):
+		self.ballots = ballots
+		# Whether to add per-shard subtotals even where addition is inexact
+		self.subtotals = subtotals
+		numConfiguration = utils._numclass.getConfiguration() if hasattr(utils._numclass, 'getConfiguration') else None
+		self.pool = multiprocessing.Pool(processes, _initWorker, (utils._numclass, numConfiguration, ballots.values, array.array('q', ballots.offsets), array.array('q', ballots.preferences)))
+		
+		numBallots = len(ballots)
+		self.shards = [(numBallots * i // processes, numBallots * (i + 1) // processes) for i in range(processes)]
+	
+	# Add each candidate's votes to candidate.ctvv and return the exhausted votes
+	# Partial sums are merged only where addition is exact (rational or fixed-point arithmetic), or if self.subtotals; otherwise every addition is replayed in ballot order, so that results match a serial count exactly
+	def distribute(self, keepValues, trackBallots):
+		exact = self.subtotals or _exactAddition()
+		detailed = trackBallots or not exact
+		
+		results = self.pool.starmap(_distributeShard, [(lo, hi, keepValues, detailed) for lo, hi in self.shards])
+		
+		candidates = self.ballots.candidates
+		exhausted = utils.num('0')
+		for totals, shardExhausted, assignments, exhaustions in results:
+			if exact:
+				for index, total in totals.items():
+					candidates[index].ctvv += total
+				exhausted += shardExhausted
+			else:
+				for i, index, value, position in assignments:
+					candidates[index].ctvv += value
+				for value in exhaustions:
+					exhausted += value
+			
+			if trackBallots:
+				for i, index, value, position in assignments:
+					candidates[index].ballots.append(common.CandidateBallot(self.ballots.ballot(i), value, position))
+		
+		return exhausted
+	
+	def close(self):
+		self.pool.close()
+		self.pool.join()
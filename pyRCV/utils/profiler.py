@@ -0,0 +1,166 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Timing and counters for the phases of a count
+#
+#    profiler = Profiler()
+#    counter.profiler = profiler
+#    counter.countVotes()
+#    profiler.report()
+#
+# Each phase records its wall time, both including and excluding (self) the phases nested within it, the number of ballots touched, the number of arithmetic operations on vote values, and (if memory tracing is enabled) the peak memory allocated during the phase.
+# Memory tracing slows the count greatly, so wall times from a profiler tracing memory should not be relied upon.
+
+import json
+import time
+import tracemalloc
+
+class Phase:
+	def __init__(self, name, round):
+		self.name = name
+		self.round = round
+		self.wall = 0
+		# Wall time less that of the phases nested within this one
+		self.selfWall = 0
+		self.ballots = 0
+		self.operations = 0
+		self.peakMemory = None
+	
+	def toJSON(self):
+		return {'phase': self.name, 'round': self.round, 'wall': self.wall, 'self': self.selfWall, 'ballots': self.ballots, 'operations': self.operations, 'peakMemory': self.peakMemory}
+
+class PhaseContext:
+	def __init__(self, profiler, phase):
+		self.profiler = profiler
+		self.phase = phase
+	
+	def __enter__(self):
+		self.outer = self.profiler.current
+		self.profiler.current = self.phase
+		if self.profiler.memory and self.outer is None:
+			tracemalloc.reset_peak()
+		self.start = time.perf_counter()
+		return self.phase
+	
+	def __exit__(self, *exc):
+		elapsed = time.perf_counter() - self.start
+		self.phase.wall += elapsed
+		self.phase.selfWall += elapsed
+		if self.outer is not None:
+			self.outer.selfWall -= elapsed
+		# Peak memory is only attributed to outermost phases, as nested phases would reset it
+		if self.profiler.memory and self.outer is None:
+			self.phase.peakMemory = tracemalloc.get_traced_memory()[1]
+		self.profiler.current = self.outer
+		return False
+
+# Round of phases after the count, such as output and countbacks, reported apart from the rounds of the count
+AFTER_COUNT = 'after-count'
+
+class Profiler:
+	def __init__(self, memory=False):
+		self.phases = []
+		self.current = None
+		# The count (round) to attribute phases to
+		self.round = None
+		
+		self.memory = memory
+		if memory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+	
+	def __bool__(self):
+		return True
+	
+	# Time the enclosed block as a phase of the given name
+	def phase(self, name):
+		phase = Phase(name, self.round)
+		self.phases.append(phase)
+		return PhaseContext(self, phase)
+	
+	# Attribute phases from now on to the time after the count, rather than to its last round
+	def afterCount(self):
+		self.round = AFTER_COUNT
+	
+	# Attribute ballots touched and operations performed to the current phase
+	def count(self, ballots=0, operations=0):
+		if self.current is not None:
+			self.current.ballots += ballots
+			self.current.operations += operations
+	
+	def stop(self):
+		if self.memory and tracemalloc.is_tracing():
+			tracemalloc.stop()
+	
+	# Return the phases, with totals by phase name and by round
+	# Totals by phase name give both the wall time including nested phases and the self time excluding them; totals by round, and the overall wall time, add self times, so that nested phases are not counted twice
+	def report(self):
+		totals = {}
+		rounds = {}
+		for phase in self.phases:
+			for key, summary in ((phase.name, totals), (phase.round, rounds)):
+				if key is None:
+					continue
+				entry = summary.setdefault(key, {'wall': 0, 'self': 0, 'ballots': 0, 'operations': 0, 'peakMemory': None})
+				entry['wall'] += phase.wall
+				entry['self'] += phase.selfWall
+				entry['ballots'] += phase.ballots
+				entry['operations'] += phase.operations
+				if phase.peakMemory is not None:
+					entry['peakMemory'] = max(entry['peakMemory'] or 0, phase.peakMemory)
+		
+		for entry in rounds.values():
+			entry['wall'] = entry.pop('self')
+		afterCount = rounds.pop(AFTER_COUNT, None)
+		
+		return {
+			'wall': sum(phase.selfWall for phase in self.phases),
+			'phases': [phase.toJSON() for phase in self.phases],
+			'totals': totals,
+			'rounds': [dict(round=key, **value) for key, value in sorted(rounds.items())],
+			'afterCount': afterCount,
+		}
+	
+	def write(self, path):
+		with open(path, 'w') as f:
+			json.dump(self.report(), f, indent=1)
+
+class NullPhaseContext:
+	def __enter__(self):
+		return None
+	
+	def __exit__(self, *exc):
+		return False
+
+# A profiler which records nothing, used when profiling is not requested
+class NullProfiler:
+	round = None
+	
+	def __init__(self):
+		self.context = NullPhaseContext()
+	
+	def __bool__(self):
+		return False
+	
+	def phase(self, name):
+		return self.context
+	
+	def afterCount(self):
+		pass
+	
+	def count(self, ballots=0, operations=0):
+		pass
+	
+	def stop(self):
+		pass
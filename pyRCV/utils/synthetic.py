@@ -0,0 +1,108 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Reproducible synthetic elections, for benchmarking and testing
+#
+# Candidates and voters are placed on a line, and each voter ranks candidates by distance from themselves plus noise.
+# correlation = 1 gives purely spatial (single-peaked) preferences; correlation = 0 gives uniformly random orderings.
+
+import random
+
+PREFERENCE_LENGTHS = ['full', 'uniform', 'geometric']
+
+class ElectionSpec:
+	def __init__(self, ballots=10000, candidates=14, seats=7, lengths='geometric', meanLength=5, correlation=0.7, popularity=1.0, seed=0):
+		self.ballots = ballots
+		self.candidates = candidates
+		self.seats = seats
+		# Distribution of the number of preferences expressed on each ballot
+		self.lengths = lengths
+		self.meanLength = meanLength
+		self.correlation = correlation
+		# Spread of the candidates' popularity: 0 makes every candidate equally popular
+		self.popularity = popularity
+		self.seed = seed
+	
+	def toJSON(self):
+		return dict(vars(self))
+
+# Yield the preferences of each ballot as lists of 0-based candidate indices
+def generatePreferences(spec):
+	rng = random.Random(spec.seed)
+	
+	positions = [rng.random() for _ in range(spec.candidates)]
+	bonuses = [rng.expovariate(1) * spec.popularity * 0.1 for _ in range(spec.candidates)]
+	noise = 1 - spec.correlation
+	
+	for _ in range(spec.ballots):
+		voter = rng.random()
+		scores = [abs(positions[j] - voter) * spec.correlation - bonuses[j] + rng.random() * noise for j in range(spec.candidates)]
+		order = sorted(range(spec.candidates), key=scores.__getitem__)
+		
+		if spec.lengths == 'full':
+			length = spec.candidates
+		elif spec.lengths == 'uniform':
+			length = rng.randint(1, spec.candidates)
+		elif spec.lengths == 'geometric':
+			length = 1
+			while length < spec.candidates and rng.random() > 1 / spec.meanLength:
+				length += 1
+		else:
+			raise ValueError('Unknown preference length distribution {}'.format(spec.lengths))
+		
+		yield order[:length]
+
+# Return the lines of a blt file for the election
+def generateBLT(spec):
+	lines = ['{} {}'.format(spec.candidates, spec.seats)]
+	for preferences in generatePreferences(spec):
+		lines.append('1 {} 0'.format(' '.join(str(x + 1) for x in preferences)))
+	lines.append('0')
+	for j in range(spec.candidates):
+		lines.append('"Candidate {}"'.format(j + 1))
+	lines.append('"Synthetic election (seed {})"'.format(spec.seed))
+	return lines
+
+def writeBLTFile(spec, path):
+	with open(path, 'w') as f:
+		for line in generateBLT(spec):
+			print(line, file=f)
+
+def addSpecArguments(parser):
+	defaults = ElectionSpec()
+	parser.add_argument('--ballots', help='Number of ballots', type=int, default=defaults.ballots)
+	parser.add_argument('--candidates', help='Number of candidates', type=int, default=defaults.candidates)
+	parser.add_argument('--seats', help='Number of seats', type=int, default=defaults.seats)
+	parser.add_argument('--lengths', help='Distribution of the number of preferences on each ballot', choices=PREFERENCE_LENGTHS, default=defaults.lengths)
+	parser.add_argument('--mean-length', help='Mean number of preferences on each ballot with --lengths geometric', type=float, default=defaults.meanLength)
+	parser.add_argument('--correlation', help='0 for random preferences, up to 1 for preferences determined by position', type=float, default=defaults.correlation)
+	parser.add_argument('--popularity', help='Spread of candidate popularity', type=float, default=defaults.popularity)
+	parser.add_argument('--seed', help='Random seed', type=int, default=defaults.seed)
+
+def specFromArgs(args):
+	return ElectionSpec(args.ballots, args.candidates, args.seats, args.lengths, args.mean_length, args.correlation, args.popularity, args.seed)
+
+def main():
+	import argparse
+	
+	parser = argparse.ArgumentParser(description='Generate a synthetic election as a blt file')
+	parser.add_argument('output', help='blt file to write')
+	addSpecArguments(parser)
+	args = parser.parse_args()
+	
+	writeBLTFile(specFromArgs(args), args.output)
+
+if __name__ == '__main__':
+	main()
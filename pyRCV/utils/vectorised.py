@@ -0,0 +1,57 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Requires NumPy, and floating-point arithmetic
+
+import numpy
+
+# A BallotSet as a padded matrix of preferences, one row per ballot, and a vector of ballot values
+# Padding refers to an extra candidate index whose keep value is always zero
+class PreferenceMatrix:
+	def __init__(self, ballotSet):
+		self.numCandidates = len(ballotSet.candidates)
+		
+		offsets = numpy.asarray(ballotSet.offsets, dtype=numpy.int64)
+		lengths = numpy.diff(offsets)
+		numBallots = len(lengths)
+		width = int(lengths.max()) if numBallots else 0
+		
+		self.matrix = numpy.full((numBallots, width), self.numCandidates, dtype=numpy.int64)
+		rows = numpy.repeat(numpy.arange(numBallots), lengths)
+		columns = numpy.arange(len(ballotSet.preferences)) - numpy.repeat(offsets[:-1], lengths)
+		self.matrix[rows, columns] = numpy.asarray(ballotSet.preferences, dtype=numpy.int64)
+		
+		self.values = numpy.asarray(ballotSet.values, dtype=numpy.float64)
+	
+	# Return the votes received by each candidate index and the exhausted votes, given the keep value of each candidate index
+	def distribute(self, keepValues):
+		keepValues = numpy.append(numpy.asarray(keepValues, dtype=numpy.float64), 0.0)
+		totals = numpy.zeros(self.numCandidates + 1)
+		assigned = numpy.zeros(len(self.values))
+		
+		# Only ballots with value still to assign are considered at each preference
+		rows = numpy.arange(len(self.values))
+		for column in range(self.matrix.shape[1]):
+			preferences = self.matrix[rows, column]
+			value = (self.values[rows] - assigned[rows]) * keepValues[preferences]
+			totals += numpy.bincount(preferences, weights=value, minlength=self.numCandidates + 1)
+			assigned[rows] += value
+			
+			rows = rows[assigned[rows] < self.values[rows]]
+			if len(rows) == 0:
+				break
+		
+		exhausted = self.values[rows] - assigned[rows]
+		return totals[:-1], float(exhausted.sum())
@@ -16,6 +16,7 @@
 
 # I love the smell of Python 3 in the morning
 
+from .utils import events
 from . import stv
 
 class WrightSTVCounter(stv.STVCounter):
@@ -27,30 +28,35 @@ class WrightSTVCounter(stv.STVCounter):
 		provisionallyElected = []
 		
 		while True:
-			self.infoLog()
-			self.infoLog("== COUNT {}".format(count))
+			self.profiler.round = count
+			self.emit(events.Round(count))
 			
 			self.resetCount(remainingCandidates)
-			self.exhausted = self.distributePreferences(self.ballots, remainingCandidates)
+			with self.profiler.phase('distribute'):
+				self.exhausted = self.distributePreferences(self.ballots, remainingCandidates)
 			
 			roundResult = self.countUntilExclude(remainingCandidates, provisionallyElected)
 			
 			# Process round
 			
 			self.exhausted += roundResult.exhausted
+			self.emit(events.Tally(roundResult.tally, self.exhausted))
 			
 			if roundResult.excluded:
 				# Reset and reiterate
 				for candidate in roundResult.excluded:
 					remainingCandidates.remove(candidate)
 				
+				# Candidates elected this round will be elected afresh after the restart
+				self.states.reset(remainingCandidates, provisionallyElected)
+				
 				if self.args['fast'] and len(remainingCandidates) <= self.args['seats']:
 					remainingCandidates.sort(key=lambda k: k.ctvv, reverse=True)
 					for candidate in remainingCandidates:
-						if candidate not in provisionallyElected:
-							print("**** {} provisionally elected on {} votes".format(candidate.name, self.toNum(candidate.ctvv)))
-							provisionallyElected.append(candidate)
-					return provisionallyElected, self.exhausted
+						if not self.states.isElected(candidate):
+							self.emit(events.ElectionOnVotes(candidate, candidate.ctvv))
+							self.provisionallyElect(candidate, provisionallyElected)
+					return provisionallyElected, None, self.exhausted
 				
 				count += 1
 				continue
@@ -62,5 +68,12 @@ class WrightSTVCounter(stv.STVCounter):
 			
 			return provisionallyElected, None, self.exhausted
 
+	@classmethod
+	def getParser(cls):
+		parser = super().getParser()
+		parser.add_argument('--incremental', help='On each restart, redistribute only the ballots of excluded candidates', action='store_true')
+		
+		return parser
+
 if __name__ == '__main__':
 	WrightSTVCounter.main()
@@ -0,0 +1,41 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A malformed manifest line is recorded as a failure, and the other entries still counted
+def test_malformed_manifest_line(tmp_path):
+	shutil.copy(os.path.join(ROOT, 'profiling', 'csm8.blt'), str(tmp_path / 'csm8.blt'))
+	manifest = tmp_path / 'manifest.jsonl'
+	manifest.write_text('{"election": "csm8.blt", "id": "first"}\n{"election": \n[1, 2]\n{"id": "none"}\n{"election": "csm8.blt", "id": "last", "nums": "float"}\n')
+
+	process = subprocess.run(
+		[sys.executable, '-m', 'pyRCV.batch', str(manifest), '--processes', '1'],
+		cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+	)
+	records = {record['id']: record for record in map(json.loads, process.stdout.splitlines())}
+
+	assert process.returncode == 1
+	assert records['first']['status'] == 'ok'
+	assert records['last']['status'] == 'ok'
+	assert [records[jobId]['status'] for jobId in ('manifest.jsonl:2', 'manifest.jsonl:3', 'manifest.jsonl:4')] == ['error'] * 3
+	assert 'counted 2 elections, 3 failed' in process.stderr
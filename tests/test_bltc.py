@@ -0,0 +1,67 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pyRCV import stv
+from pyRCV import utils
+from pyRCV.utils import blt, bltc
+
+import argparse
+import pytest
+
+ELECTION = '''3 1
+1.5 1 2 0
+0.1 2 0
+2 3 1 0
+0.25 1 3 2 0
+1.5 1 2 0
+0
+"A"
+"B"
+"C"
+"Fractional weights"
+'''
+
+@pytest.fixture(autouse=True)
+def restoreNums():
+	numclass = utils._numclass
+	yield
+	utils._numclass = numclass
+
+def setNums(nums):
+	stv.STVCounter.setNums(argparse.Namespace(nums=nums, decimals=6, rounding='truncate'))
+
+@pytest.mark.parametrize('aggregate', [False, True])
+@pytest.mark.parametrize('nums', ['fraction', 'float', 'decimal', 'fixed'])
+def test_fractional_weights_round_trip(tmp_path, nums, aggregate):
+	source = tmp_path / 'election.blt'
+	source.write_text(ELECTION)
+	compiled = str(tmp_path / 'election.bltc')
+
+	# Compiled as by bltc.main, with rational arithmetic
+	with open(str(source), 'r') as f:
+		ballots, candidates, seats = blt.readBLTFile(f, aggregate=aggregate)
+	with open(compiled, 'wb') as f:
+		bltc.writeBLTC(ballots, seats, f)
+
+	setNums(nums)
+	with open(str(source), 'r') as f:
+		expected, expectedCandidates, expectedSeats = blt.readBLTFile(f, aggregate=aggregate)
+	loaded, loadedCandidates, loadedSeats = bltc.readBLTC(compiled)
+
+	assert type(loaded.values[0]) is utils._numclass
+	assert list(loaded.values) == list(expected.values)
+	assert [list(loaded.preferencesOf(i)) for i in range(len(loaded))] == [list(expected.preferencesOf(i)) for i in range(len(expected))]
+	assert [x.name for x in loadedCandidates] == [x.name for x in expectedCandidates]
+	assert loadedSeats == expectedSeats
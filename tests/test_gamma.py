@@ -0,0 +1,52 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pyRCV.utils import gamma
+
+import itertools
+import pytest
+
+# Gamma sum computed term by term, as before the tables were precomputed
+def reference_encode(choices, nr_candidates):
+	if not choices:
+		return 0
+	sumus = gamma.get_offsets(nr_candidates)[len(choices) - 1]
+	b = nr_candidates - len(choices)
+	for i in range(1, len(choices) + 1):
+		sumus += choices[-i] * gamma.get_factor(b, i)
+	return sumus + 1
+
+def test_fewer_choices_than_candidates():
+	assert gamma.gamma_encode([1, 0], 4, 2) == 9
+	assert gamma.gamma_decode(9, 4, 2) == [1, 0]
+
+@pytest.mark.parametrize('nr_candidates', range(1, 6))
+def test_round_trip_up_to_max_choices(nr_candidates):
+	for max_choices in range(1, nr_candidates + 1):
+		codec = gamma.GammaCodec(nr_candidates, max_choices)
+		for nr_choices in range(max_choices + 1):
+			for ranking in itertools.permutations(range(nr_candidates), nr_choices):
+				choices = gamma.to_relative_answers(list(ranking), nr_candidates)
+				sumus = codec.encode(choices)
+				assert sumus == reference_encode(choices, nr_candidates)
+				assert sumus == gamma.gamma_encode(choices, nr_candidates, max_choices)
+				assert codec.decode(sumus) == choices
+
+def test_too_many_choices():
+	codec = gamma.GammaCodec(4, 2)
+	with pytest.raises(AssertionError):
+		codec.encode([0, 0, 0])
+	with pytest.raises(AssertionError):
+		codec.decode(gamma.gamma_encode([0, 0, 0], 4))
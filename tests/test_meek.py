@@ -0,0 +1,34 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pyRCV.utils import synthetic
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rounding each ballot's share made keep values drift forever, so a fixed-point Meek count never finished
+def test_fixed_point_is_refused(tmp_path):
+	path = str(tmp_path / 'election.blt')
+	synthetic.writeBLTFile(synthetic.ElectionSpec(ballots=1500, candidates=8, seats=3, seed=1), path)
+	
+	result = subprocess.run(
+		[sys.executable, '-m', 'pyRCV.meek_stv', '--election', path, '--nums', 'fixed', '--quota', 'geq-hb', '--quota-prog', '--ties', 'backward', '--quiet'],
+		cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=60,
+	)
+	assert result.returncode != 0
+	assert 'Meek STV cannot use fixed-point arithmetic' in result.stderr
@@ -0,0 +1,35 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from pyRCV.utils.profiler import Profiler
+
+# Phases after the count are totalled apart, not added to its last round
+def test_after_count_is_reported_separately():
+	profiler = Profiler()
+	for count in (1, 2):
+		profiler.round = count
+		with profiler.phase('distribute'):
+			profiler.count(ballots=10)
+	profiler.afterCount()
+	with profiler.phase('output'):
+		profiler.count(ballots=3)
+	with profiler.phase('countback'):
+		profiler.count(ballots=4)
+
+	report = profiler.report()
+	assert [entry['round'] for entry in report['rounds']] == [1, 2]
+	assert report['rounds'][-1]['ballots'] == 10
+	assert report['afterCount']['ballots'] == 7
@@ -0,0 +1,64 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pyRCV.utils.common import Candidate, TallyHistory
+
+from fractions import Fraction
+import random
+
+# The backward tie-break over full rows of votes, with None for candidates not in the count
+def reference_lowest(rows, candidates, tiedCandidates):
+	indices = [candidate.index for candidate in tiedCandidates]
+	for row in reversed(rows):
+		values = [row[i] for i in indices if row[i] is not None]
+		if not values:
+			continue
+		lowest = min(values)
+		if values.count(lowest) > 1:
+			continue
+		if sum(1 for votes in row if votes is not None and votes == lowest) > 1:
+			continue
+		return next(candidates[i] for i in indices if row[i] is not None and row[i] == lowest)
+	return None
+
+def test_matches_full_rows():
+	rng = random.Random(0)
+	for trial in range(200):
+		candidates = [Candidate(str(i)) for i in range(rng.randint(2, 8))]
+		for index, candidate in enumerate(candidates):
+			candidate.index = index
+
+		history = TallyHistory(candidates)
+		rows = []
+		votes = {candidate: Fraction(rng.randint(0, 5)) for candidate in candidates}
+		for round in range(rng.randint(1, 12)):
+			# Drop some candidates from the count, sometimes bringing them back, and change a few totals
+			for candidate in candidates:
+				if rng.random() < 0.15:
+					votes.pop(candidate, None)
+				elif candidate not in votes and rng.random() < 0.3:
+					votes[candidate] = Fraction(rng.randint(0, 5))
+				elif candidate in votes and rng.random() < 0.4:
+					votes[candidate] += Fraction(rng.randint(-2, 3), rng.randint(1, 3))
+			history.append(dict(votes))
+			rows.append([votes.get(candidate) for candidate in candidates])
+
+		assert len(history) == len(rows)
+		for round, row in enumerate(rows):
+			for candidate in candidates:
+				assert history.votes(round, candidate) == row[candidate.index]
+		for size in range(2, len(candidates) + 1):
+			tied = rng.sample(candidates, size)
+			assert history.lowestBackward(tied) is reference_lowest(rows, candidates, tied)
@@ -0,0 +1,40 @@
+#    Copyright © 2016-2019 RunasSudo (Yingtong Li)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The council elected by the reference implementation, profiling/WrightTalleyCSM8.py
+CSM8_COUNCIL = {
+	'mynnna', 'Ripard Teg', 'Trebor Daehdoow', 'Kesper North', 'Chitsa Jason', 'Malcanis', 'Mangala Solaris',
+	'Mike Azariah', 'Korvin', 'progodlegend', 'Sort Dragon', 'James Arget', 'Sala Cameron', 'Ali Aras',
+}
+
+def winners(output):
+	lines = output.splitlines()
+	start = lines.index('The winners are, in order of election:') + 2
+	end = lines.index('', start)
+	return [line.strip() for line in lines[start:end]]
+
+# Candidates excluded at a restart must receive no votes when the ballots are redistributed
+def test_csm8_matches_reference():
+	output = subprocess.run(
+		[sys.executable, '-m', 'pyRCV.wright_stv', '--election', os.path.join('profiling', 'csm8.blt'), '--nums', 'float', '--quota-prog', '--quiet'],
+		cwd=ROOT, stdout=subprocess.PIPE, universal_newlines=True, check=True,
+	).stdout
+	assert set(winners(output)) == CSM8_COUNCIL